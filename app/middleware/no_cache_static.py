@@ -1,16 +1,29 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 
 
 class NoCache:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
         """
         set the "Cache-Control" header to "must-revalidate, no-cache"
         """
-        response = self.get_response(request)
-
         if settings.DEBUG and request.path.startswith("/static/"):
             response["Cache-Control"] = "no-cache"
 
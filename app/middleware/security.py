@@ -1,10 +1,25 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
 class CrossOriginHeadersMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
 
+    def process_response(self, request, response):
         response["Cross-Origin-Embedder-Policy"] = 'require-corp; report-to="default"'
         response["Cross-Origin-Opener-Policy"] = 'same-origin; report-to="default"'
         response["Cross-Origin-Resource-Policy"] = "same-origin"
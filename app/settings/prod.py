@@ -16,6 +16,21 @@ CSRF_COOKIE_SECURE = True
 CSRF_TRUSTED_ORIGINS = ["https://*.northridge.dev"]
 SESSION_COOKIE_SECURE = True
 
+# Shared by all gunicorn workers on the host.
+CACHES = {
+    "default": env.cache(
+        "CACHE_URL", default=f"filecache://{BASE_DIR / 'cache' / 'django'}"
+    )
+}
 
 INSTALLED_APPS.append("django.contrib.staticfiles")
-STATIC_ROOT = "static/"
+
+# `npm run build` writes the bundles to static/; collectstatic copies them and
+# the apps' static files to STATIC_ROOT under content-hashed names, with
+# compressed copies (see app/storage.py).
+STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = env("STATIC_ROOT", default=str(BASE_DIR / "staticfiles"))
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "app.storage.CompressedManifestStaticFilesStorage"},
+}
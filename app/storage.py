@@ -0,0 +1,55 @@
+import gzip
+import os
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".html", ".js", ".json", ".map", ".svg", ".txt")
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static files with content-hashed names. Each hashed text file is also
+    written gzip and brotli compressed, as name.gz and name.br next to it, for
+    serve_static to send instead. Without brotli (in requirements.txt) only
+    the gzip copies are written.
+    """
+
+    min_compress_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name: str):
+        """
+        Write the compressed copies of a hashed file that do not exist yet.
+        Its name changes with its contents, so existing ones are current.
+        """
+        path = self.path(name)
+        compressors = {".gz": lambda data: gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            compressors[".br"] = brotli.compress
+
+        data = None
+        for suffix, compress in compressors.items():
+            if os.path.exists(path + suffix):
+                continue
+            if data is None:
+                with open(path, "rb") as file:
+                    data = file.read()
+                if len(data) < self.min_compress_size:
+                    return
+
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as file:
+                    file.write(compressed)
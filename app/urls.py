@@ -1,10 +1,21 @@
+import functools
+import re
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.contrib.staticfiles.views import serve
 from django.conf.urls.static import static
 from django.shortcuts import redirect
 from django.contrib.auth import logout
+from django.utils.cache import patch_vary_headers
+from django.views import static as static_views
+
+# Compressed copies written by app.storage, in order of preference.
+STATIC_ENCODINGS = [
+    (re.compile(r"\bbr\b"), ".br"),
+    (re.compile(r"\bgzip\b"), ".gz"),
+]
 
 
 def custom_logout_view(request):
@@ -25,6 +36,40 @@ def custom_serve(request, path, insecure=False, **kwargs):
     return response
 
 
+@functools.cache
+def get_hashed_static_names() -> frozenset[str]:
+    return frozenset(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+
+def serve_static(request, path):
+    """
+    Serve a file from STATIC_ROOT when DEBUG is off, compressed if the client
+    accepts a compressed copy of it. Content-hashed names never change, so
+    they are cached for a year; other names are revalidated every time.
+    """
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    served_path = path
+    for pattern, suffix in STATIC_ENCODINGS:
+        if pattern.search(accept_encoding) and staticfiles_storage.exists(
+            path + suffix
+        ):
+            served_path = path + suffix
+            break
+
+    # Sets Content-Encoding from the .br or .gz suffix.
+    response = static_views.serve(
+        request, served_path, document_root=staticfiles_storage.location
+    )
+    if served_path != path:
+        response.headers.pop("Content-Disposition", None)
+    patch_vary_headers(response, ["Accept-Encoding"])
+    if path in get_hashed_static_names():
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response["Cache-Control"] = "no-cache"
+    return response
+
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("account/", include("account.urls")),
@@ -33,3 +78,11 @@ urlpatterns = [
     path("logout/", custom_logout_view, name="logout"),
     *static(settings.STATIC_URL, view=custom_serve),
 ]
+
+if not settings.DEBUG and settings.STATIC_SERVE:
+    urlpatterns.append(
+        re_path(
+            r"^%s(?P<path>.+)$" % re.escape(settings.STATIC_URL.lstrip("/")),
+            serve_static,
+        )
+    )
@@ -1,11 +1,122 @@
 import json
+import os
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
 from django.http import JsonResponse
+from django.utils import timezone
+from .importer.build_courses import courses
+from .importer.parsers import Lesson, lesson_files
 from .models import Challenge
+from .progress import invalidate_user_progress, record_completion
+from .revisions import record_revisions
+from .save_buffer import get_base_code, save_buffer
 
+MAX_BATCH_OPERATIONS = 200
 
-def split_lesson_id(request):
-    lesson_id = json.loads(request.body)["lesson_id"]
-    return lesson_id.split("/")
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+def read_json(request):
+    """
+    Parse the JSON request body, reading the stream once and no further than
+    DATA_UPLOAD_MAX_MEMORY_SIZE.
+    """
+    max_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+
+    if max_size is not None and length > max_size:
+        raise PayloadTooLarge("Request body too large")
+
+    body = request.read() if max_size is None else request.read(max_size + 1)
+    if max_size is not None and len(body) > max_size:
+        raise PayloadTooLarge("Request body too large")
+
+    return json.loads(body)
+
+
+def get_lesson(lesson_id) -> Lesson:
+    lesson = courses.get_lesson(lesson_id) if isinstance(lesson_id, str) else None
+    if not lesson:
+        raise ValueError("Invalid lesson_id %s" % lesson_id)
+    return lesson
+
+
+def get_code(payload: dict):
+    code = payload.get("code")
+    if code is not None and not isinstance(code, str):
+        raise ValueError("Invalid code")
+    if code and len(code.encode()) > settings.CHALLENGE_MAX_CODE_SIZE:
+        raise PayloadTooLarge("Code too large")
+    return code
+
+
+def parse_body(request):
+    payload = read_json(request)
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid payload")
+    lesson = get_lesson(payload.get("lesson_id"))
+    return payload, lesson.id
+
+
+def error_response(error: ValueError):
+    if isinstance(error, PayloadTooLarge):
+        return JsonResponse({"message": str(error)}, status=413)
+    return JsonResponse({"message": "Error"}, status=400)
+
+
+def upsert_challenge(user_id: int, lesson_id: str, last_attempt, **fields) -> bool:
+    challenge = Challenge.from_lesson_id(
+        user_id,
+        lesson_id,
+        base_code=get_base_code(lesson_id),
+        last_attempt=last_attempt,
+        **fields,
+    )
+    return bool(Challenge.objects.upsert([challenge], [*fields, "last_attempt"]))
+
+
+def update_challenge(user_id: int, lesson_id: str, last_attempt=None, **fields):
+    """
+    Upsert a challenge, append saved code to its revisions and, if its
+    completed flag is set, keep the unit progress record in step. Nothing
+    is written if the row was already written after `last_attempt` (the
+    request time, now by default). Cached progress is invalidated once
+    committed.
+    """
+    lesson = courses.get_lesson(lesson_id)
+
+    with transaction.atomic():
+        if not upsert_challenge(
+            user_id, lesson_id, last_attempt or timezone.now(), **fields
+        ):
+            return
+        if lesson and "completed" in fields:
+            record_completion(user_id, {lesson: fields["completed"]})
+        if "code" in fields:
+            record_revisions(
+                user_id, {lesson_id: (fields["code"], fields.get("completed", False))}
+            )
+
+    invalidate_user_progress(user_id, [lesson_id])
+
+
+def complete_challenge(user_id: int, lesson_id: str, code: str | None):
+    # Stamped before waiting on the save buffer, so saves made earlier lose.
+    now = timezone.now()
+    save_buffer.discard(user_id, lesson_id)
+    update_challenge(user_id, lesson_id, now, completed=True, code=code)
+
+
+def reset_challenge(user_id: int, lesson_id: str):
+    now = timezone.now()
+    save_buffer.discard(user_id, lesson_id)
+    update_challenge(user_id, lesson_id, now, code=None, completed=False)
 
 
 def mark_complete(request):
@@ -13,18 +124,12 @@ def mark_complete(request):
         return JsonResponse({"message": "OK"})
 
     try:
-        course_slug, unit_slug, lesson_slug = split_lesson_id(request)
-        code = json.loads(request.body).get("code")
-        Challenge.objects.update_or_create(
-            user=request.user,
-            course_slug=course_slug,
-            unit_slug=unit_slug,
-            lesson_slug=lesson_slug,
-            defaults={"completed": True, "code": code},
-        )
+        payload, lesson_id = parse_body(request)
+        code = get_code(payload)
+    except ValueError as error:
+        return error_response(error)
 
-    except json.JSONDecodeError:
-        return JsonResponse({"message": "Error"}, status=500)
+    complete_challenge(request.user.pk, lesson_id, code)
 
     return JsonResponse({"message": "OK"})
 
@@ -34,18 +139,12 @@ def save_code(request):
         return JsonResponse({"message": "OK"})
 
     try:
-        course_slug, unit_slug, lesson_slug = split_lesson_id(request)
-        code = json.loads(request.body).get("code")
-        Challenge.objects.update_or_create(
-            user=request.user,
-            course_slug=course_slug,
-            unit_slug=unit_slug,
-            lesson_slug=lesson_slug,
-            defaults={"code": code},
-        )
+        payload, lesson_id = parse_body(request)
+        code = get_code(payload)
+    except ValueError as error:
+        return error_response(error)
 
-    except json.JSONDecodeError:
-        return JsonResponse({"message": "Error"}, status=500)
+    save_buffer.add(request.user.pk, lesson_id, code)
 
     return JsonResponse({"message": "OK"})
 
@@ -55,16 +154,184 @@ def reset_code(request):
         return JsonResponse({"message": "OK"})
 
     try:
-        course_slug, unit_slug, lesson_slug = split_lesson_id(request)
-        Challenge.objects.update_or_create(
-            user=request.user,
-            course_slug=course_slug,
-            unit_slug=unit_slug,
-            lesson_slug=lesson_slug,
-            defaults={"code": None, "completed": False},
-        )
+        _, lesson_id = parse_body(request)
+    except ValueError as error:
+        return error_response(error)
+
+    reset_challenge(request.user.pk, lesson_id)
+
+    return JsonResponse({"message": "OK"})
+
+
+# Async variants of the endpoints above, used when ASYNC_VIEWS is set. Writes
+# that need a transaction still run in a thread, as Django's async ORM does
+# not support transactions.
+
+
+async def amark_complete(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"message": "OK"})
+
+    try:
+        payload, lesson_id = parse_body(request)
+        code = get_code(payload)
+    except ValueError as error:
+        return error_response(error)
+
+    await sync_to_async(complete_challenge)(user.pk, lesson_id, code)
+
+    return JsonResponse({"message": "OK"})
+
+
+async def asave_code(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"message": "OK"})
+
+    try:
+        payload, lesson_id = parse_body(request)
+        code = get_code(payload)
+    except ValueError as error:
+        return error_response(error)
+
+    await save_buffer.aadd(user.pk, lesson_id, code)
+
+    return JsonResponse({"message": "OK"})
 
-    except json.JSONDecodeError:
-        print("error: ", request.body)
+
+async def areset_code(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"message": "OK"})
+
+    try:
+        _, lesson_id = parse_body(request)
+    except ValueError as error:
+        return error_response(error)
+
+    await sync_to_async(reset_challenge)(user.pk, lesson_id)
 
     return JsonResponse({"message": "OK"})
+
+
+def apply_operation(fields: dict, operation: dict):
+    op = operation.get("op")
+    if op == "save":
+        fields["code"] = get_code(operation)
+    elif op == "complete":
+        fields.update(completed=True, code=get_code(operation))
+    elif op == "reset":
+        fields.update(code=None, completed=False)
+    else:
+        raise ValueError("Unknown operation %s" % op)
+
+
+def batch(request):
+    """
+    Apply a list of save/complete/reset operations in one transaction.
+
+    Operations on the same lesson are folded in order into the final state
+    for that lesson, and lessons that end up updating the same fields are
+    written with one bulk upsert. Returns one result per operation.
+
+    Clients queue operations per user and send that user's id along; they
+    are refused with 403, and kept by the client, unless it is the user
+    logged in.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"message": "Forbidden"}, status=403)
+
+    try:
+        payload = read_json(request)
+        operations = payload["operations"]
+        if not isinstance(operations, list):
+            raise ValueError("operations must be a list")
+    except PayloadTooLarge as error:
+        return error_response(error)
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({"message": "Error"}, status=400)
+
+    if payload.get("user_id") != request.user.pk:
+        return JsonResponse({"message": "Forbidden"}, status=403)
+
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return JsonResponse({"message": "Too many operations"}, status=400)
+
+    now = timezone.now()
+
+    results = []
+    states = {}
+
+    for operation in operations:
+        try:
+            if not isinstance(operation, dict):
+                raise ValueError("Invalid operation")
+            lesson_id = get_lesson(operation.get("lesson_id")).id
+            fields = dict(states.get(lesson_id, {}))
+            apply_operation(fields, operation)
+        except ValueError as error:
+            results.append({"status": "error", "message": str(error)})
+            continue
+
+        states[lesson_id] = fields
+        results.append({"status": "ok"})
+
+    groups = {}
+    completion = {}
+    for lesson_id, fields in states.items():
+        lesson = courses.get_lesson(lesson_id)
+        if lesson and "completed" in fields:
+            completion[lesson] = fields["completed"]
+        save_buffer.discard(request.user.pk, lesson_id)
+        groups.setdefault(tuple(sorted(fields)), []).append(
+            Challenge.from_lesson_id(
+                request.user.pk,
+                lesson_id,
+                base_code=get_base_code(lesson_id),
+                last_attempt=now,
+                **fields,
+            )
+        )
+
+    with transaction.atomic():
+        written = set()
+        for update_fields, challenges in groups.items():
+            written |= Challenge.objects.upsert(
+                challenges, [*update_fields, "last_attempt"]
+            )
+        # Lessons written since this request arrived keep the newer state.
+        states = {
+            lesson_id: fields
+            for lesson_id, fields in states.items()
+            if (request.user.pk, lesson_id) in written
+        }
+        completion = {
+            lesson: completed
+            for lesson, completed in completion.items()
+            if lesson.id in states
+        }
+        if completion:
+            record_completion(request.user.pk, completion)
+        record_revisions(
+            request.user.pk,
+            {
+                lesson_id: (fields["code"], fields.get("completed", False))
+                for lesson_id, fields in states.items()
+                if "code" in fields
+            },
+        )
+
+    invalidate_user_progress(request.user.pk, states)
+
+    return JsonResponse({"message": "OK", "results": results})
+
+
+def lesson_file_stats(request):
+    """
+    Counters of this worker's lazy lesson file cache, for staff.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"message": "Forbidden"}, status=403)
+
+    return JsonResponse({"pid": os.getpid(), **lesson_files.get_stats()})
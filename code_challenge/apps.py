@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class CodeChallengeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'code_challenge'
+
+    def ready(self):
+        if settings.COURSE_AUTO_RELOAD:
+            from .importer.watcher import start_watcher
+
+            request_started.connect(start_watcher, dispatch_uid="course_watcher")
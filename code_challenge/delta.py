@@ -0,0 +1,49 @@
+import re
+from difflib import SequenceMatcher
+
+# Lines, also splitting after escaped newlines so that code saved as JSON
+# (html lessons) diffs line by line too.
+TOKEN_PATTERN = re.compile(r"(?<=\n)|(?<=\\n)")
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.split(text) if token]
+
+
+def make_delta(base: str, code: str) -> list:
+    """
+    Describe `code` as edits of `base`: a positive number copies that many
+    lines of base, a negative number skips them, and a string is inserted.
+    """
+    base_tokens = tokenize(base)
+    code_tokens = tokenize(code)
+    delta = []
+
+    matcher = SequenceMatcher(None, base_tokens, code_tokens)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        if j2 > j1:
+            delta.append("".join(code_tokens[j1:j2]))
+
+    return delta
+
+
+def apply_delta(base: str, delta: list) -> str:
+    base_tokens = tokenize(base)
+    position = 0
+    parts = []
+
+    for edit in delta:
+        if isinstance(edit, str):
+            parts.append(edit)
+        elif edit > 0:
+            parts.extend(base_tokens[position : position + edit])
+            position += edit
+        else:
+            position -= edit
+
+    return "".join(parts)
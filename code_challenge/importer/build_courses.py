@@ -1,50 +1,69 @@
+import logging
 import os
 from django.conf import settings
-from ..importer.parsers import Course, Unit, Lesson
+from ..importer.loader import build_course, build_courses, get_course_dirs  # noqa
+from ..importer.registry import CourseRegistry
+from ..importer.snapshot import is_course_unchanged, read_manifest, read_snapshot
 
+logger = logging.getLogger(__name__)
 
-def build_course(course_dir: str) -> Course:
-    course = Course(course_dir)
 
-    unit_dirs = sorted(
-        [
-            os.path.join(course_dir, unit_dir)
-            for unit_dir in os.listdir(course_dir)
-            if os.path.isdir(os.path.join(course_dir, unit_dir))
-            and not unit_dir.startswith(".")
-        ]
-    )
+def read_snapshot_courses(course_dirs: list[str]) -> dict:
+    """
+    The courses in COURSE_SNAPSHOT, by directory, whose files under
+    COURSE_ROOT still match the snapshot's manifest.
+    """
+    snapshot = read_snapshot(settings.COURSE_SNAPSHOT)
+    if snapshot is None:
+        return {}
+    manifest = read_manifest(f"{settings.COURSE_SNAPSHOT}.manifest.json")
+    manifest = manifest.get("courses", {})
 
-    for unit_dir in unit_dirs:
-        unit = Unit(unit_dir, course)
-        course.add_unit(unit)
-        for lesson_dir in sorted(os.listdir(unit_dir)):
-            if os.path.isdir(os.path.join(unit_dir, lesson_dir)):
-                lesson = Lesson(os.path.join(unit_dir, lesson_dir), unit)
-                unit.add_lesson(lesson)
+    courses = {}
+    for course_dir in course_dirs:
+        name = os.path.basename(course_dir)
+        entry = snapshot.get(name)
+        files = manifest.get(name, {})
+        if (
+            entry
+            and entry[0] == files.get("digest")
+            and is_course_unchanged(course_dir, files.get("files", {}))
+        ):
+            courses[course_dir] = entry[1]
 
-    return course
+    return courses
 
 
 def get_courses():
-    courses_root = settings.COURSE_ROOT
+    course_dirs = get_course_dirs(settings.COURSE_ROOT)
+    loaded = {}
 
-    course_dirs = sorted(
-        [
-            os.path.join(courses_root, course_dir)
-            for course_dir in os.listdir(courses_root)
-            if os.path.isdir(os.path.join(courses_root, course_dir))
-            and not course_dir.startswith(".")
-        ]
-    )
+    if settings.COURSE_SNAPSHOT:
+        loaded = read_snapshot_courses(course_dirs)
+        if len(loaded) < len(course_dirs):
+            logger.warning(
+                "%d of %d courses changed since %s was built; parsing them. "
+                "Run manage.py build_courses to update it.",
+                len(course_dirs) - len(loaded),
+                len(course_dirs),
+                settings.COURSE_SNAPSHOT,
+            )
+
+    stale = [course_dir for course_dir in course_dirs if course_dir not in loaded]
+    loaded.update(zip(stale, build_courses(stale)))
 
     courses = {}
 
-    for course_dir in course_dirs:
-        course = build_course(course_dir)
+    for course in (loaded[course_dir] for course_dir in course_dirs):
+        if course.slug in courses:
+            raise ValueError(
+                "Duplicate course slug %s in %s" % (course.slug, course.directory)
+            )
         courses[course.slug] = course
 
     return courses
 
 
-courses = get_courses()
+# Loaded on import. Code that must not load courses, such as the
+# build_courses command, imports from importer.loader instead.
+courses = CourseRegistry(get_courses())
@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from ..importer.parsers import Course, Unit, Lesson
+
+
+def get_unit_dirs(course_dir: str) -> list[str]:
+    return sorted(
+        [
+            os.path.join(course_dir, unit_dir)
+            for unit_dir in os.listdir(course_dir)
+            if os.path.isdir(os.path.join(course_dir, unit_dir))
+            and not unit_dir.startswith(".")
+        ]
+    )
+
+
+def get_lesson_dirs(unit_dir: str) -> list[str]:
+    return [
+        os.path.join(unit_dir, lesson_dir)
+        for lesson_dir in sorted(os.listdir(unit_dir))
+        if os.path.isdir(os.path.join(unit_dir, lesson_dir))
+    ]
+
+
+def read_unit(unit_dir: str, course: Course, lazy: bool) -> tuple[Unit, list[Lesson]]:
+    """
+    Parse a unit and its lessons, in directory order, without linking them
+    into the course.
+    """
+    unit = Unit(unit_dir, course)
+    lessons = [
+        Lesson(lesson_dir, unit, lazy) for lesson_dir in get_lesson_dirs(unit_dir)
+    ]
+    return unit, lessons
+
+
+def build_courses(
+    course_dirs: list[str], workers: int | None = None, lazy: bool | None = None
+) -> list[Course]:
+    """
+    Parse courses, reading their units on up to `workers` threads
+    (COURSE_IMPORT_WORKERS by default). Lazy lessons only read their
+    meta.json (COURSE_LAZY_FILES by default). Units and lessons are linked
+    afterwards in directory order, so the result is the same as reading them
+    one at a time.
+    """
+    if workers is None:
+        workers = settings.COURSE_IMPORT_WORKERS
+    if lazy is None:
+        lazy = settings.COURSE_LAZY_FILES
+
+    courses = [Course(course_dir) for course_dir in course_dirs]
+    jobs = [
+        (unit_dir, course, lazy)
+        for course in courses
+        for unit_dir in get_unit_dirs(course.directory)
+    ]
+
+    workers = min(workers, len(jobs))
+    if workers > 1:
+        with ThreadPoolExecutor(workers, thread_name_prefix="course-import") as pool:
+            units = list(pool.map(lambda job: read_unit(*job), jobs))
+    else:
+        units = [read_unit(*job) for job in jobs]
+
+    for unit, lessons in units:
+        unit.parent.add_unit(unit)
+        for lesson in lessons:
+            unit.add_lesson(lesson)
+
+    return courses
+
+
+def build_course(course_dir: str) -> Course:
+    return build_courses([course_dir])[0]
+
+
+def get_course_dirs(courses_root: str) -> list[str]:
+    return sorted(
+        [
+            os.path.join(courses_root, course_dir)
+            for course_dir in os.listdir(courses_root)
+            if os.path.isdir(os.path.join(courses_root, course_dir))
+            and not course_dir.startswith(".")
+        ]
+    )
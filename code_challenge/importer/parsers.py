@@ -1,261 +1,565 @@
 import os
 import json
+import sys
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+MOCHA_CONFIG = json.dumps(
+    {"reporter": "json", "reporterOptions": ["output=./test-results.json"]}
+)
+
+PACKAGE_JSON_JAVASCRIPT = json.dumps(
+    {
+        "name": "codilla",
+        "type": "module",
+        "dependencies": {
+            "chai": "^5.1.1",
+            "mocha": "^10.6.0",
+        },
+        "scripts": {
+            "test": "mocha test.js",
+        },
+    }
+)
+
+PACKAGE_JSON_HTML = json.dumps(
+    {
+        "name": "codilla",
+        "type": "module",
+        "dependencies": {
+            "chai": "^5.1.1",
+            "mocha": "^10.6.0",
+            "vite": "^5.4.0",
+        },
+        "scripts": {
+            "test": "mocha test.js",
+            "start": "vite --port 3111",
+        },
+    }
+)
+
+# Same escapes as Django's json_script, so the output can be embedded in a
+# <script type="application/json"> tag as is.
+SCRIPT_JSON_ESCAPES = {
+    ord(">"): "\\u003E",
+    ord("<"): "\\u003C",
+    ord("&"): "\\u0026",
+}
+
+
+def to_script_json(value) -> str:
+    return json.dumps(value).translate(SCRIPT_JSON_ESCAPES)
+
+
+def compile_file_system(files: list[tuple[str, str | None]]) -> list[str]:
+    """
+    Serialize a WebContainer file system tree from (filename, contents) pairs
+    into JSON segments, splitting it wherever contents is None. Pass the
+    segments to fill_file_system() to supply those contents.
+    """
+    segments = []
+    current = "{"
+
+    for index, (filename, contents) in enumerate(files):
+        if index:
+            current += ", "
+        current += to_script_json(filename) + ': {"file": {"contents": '
+        if contents is None:
+            segments.append(current)
+            current = ""
+        else:
+            current += to_script_json(contents)
+        current += "}}"
+
+    segments.append(current + "}")
+    return segments
+
+
+def fill_file_system(segments: list[str], contents: list[str | None]) -> str:
+    parts = [segments[0]]
+    for value, segment in zip(contents, segments[1:]):
+        parts.append(to_script_json(value))
+        parts.append(segment)
+    return "".join(parts)
+
+
+class ReadStats:
+    """
+    Count of the course files read and their total size, for import_stats.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, size: int):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def reset(self):
+        with self._lock:
+            self.files = 0
+            self.bytes = 0
+
+
+read_stats = ReadStats()
+
+
+def read_text(path: str) -> str:
+    with open(path, "r") as file:
+        text = file.read()
+        read_stats.add(os.fstat(file.fileno()).st_size)
+    return text
+
+
+def read_metadata(directory: str) -> dict:
+    try:
+        return json.loads(read_text(os.path.join(directory, "meta.json")))
+    except FileNotFoundError:
+        raise ValueError("Could not find meta.json in %s" % directory)
+    except json.JSONDecodeError:
+        raise ValueError("Invalid JSON metadata")
+
+
+def intern_value(value):
+    """
+    Intern metadata strings, which repeat across lessons (slugs, languages,
+    types, versions), so each distinct value is stored once.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# Files holding each part of a lesson, by language.
+LESSON_FILENAMES = {
+    "html": {
+        "instructions": "instructions.md",
+        "source": "source.html",
+        "style": "styles.css",
+        "script": "script.js",
+        "test": "test.js",
+    },
+    "javascript": {
+        "instructions": "instructions.md",
+        "source": "source.js",
+        "test": "test.js",
+    },
+    "python": {
+        "instructions": "instructions.md",
+        "source": "source.py",
+        "test": "test.py",
+    },
+}
+
+
+def get_mtimes(directory: str, filenames: dict[str, str]) -> tuple:
+    mtimes = []
+    for filename in filenames.values():
+        try:
+            mtimes.append(os.stat(os.path.join(directory, filename)).st_mtime_ns)
+        except FileNotFoundError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+class LessonFiles:
+    """
+    The file bodies of a lesson, read together, and the values derived from
+    them. Missing files read as empty strings.
+    """
+
+    __slots__ = (
+        "language",
+        "mtimes",
+        "checked_at",
+        "bodies",
+        "size",
+        "context",
+        "_starter_code",
+        "_file_system_segments",
+    )
+
+    def __init__(self, directory: str, language: str, mtimes: tuple | None = None):
+        self.language = language
+        self.mtimes = mtimes
+        self.checked_at = time.monotonic()
+        self.bodies = {}
+        self._starter_code = None
+        self._file_system_segments = None
+
+        for file_type, filename in LESSON_FILENAMES.get(language, {}).items():
+            try:
+                self.bodies[file_type] = read_text(os.path.join(directory, filename))
+            except FileNotFoundError:
+                self.bodies[file_type] = ""
+
+        self.size = sum(len(body) for body in self.bodies.values())
+        # The lesson page context; see lesson_context.py.
+        self.context = None
+
+    def get(self, file_type: str) -> str:
+        return self.bodies.get(file_type, "")
+
+    @property
+    def starter_code(self) -> str:
+        """
+        The code a student starts from, in the form the editor saves it.
+        """
+        if self._starter_code is None:
+            self._starter_code = self.build_starter_code()
+        return self._starter_code
+
+    @property
+    def file_system_segments(self) -> list[str]:
+        if self._file_system_segments is None:
+            self._file_system_segments = self.build_file_system_segments()
+        return self._file_system_segments
+
+    def warm_up(self):
+        """
+        Derive the values otherwise built on first use, e.g. before a snapshot
+        is written, so that they ship with it.
+        """
+        if self._starter_code is None:
+            self._starter_code = self.build_starter_code()
+        if self._file_system_segments is None:
+            self._file_system_segments = self.build_file_system_segments()
+
+    def build_starter_code(self) -> str:
+        if self.language == "html":
+            return json.dumps(
+                {
+                    "html": self.get("source"),
+                    "css": self.get("style"),
+                    "js": self.get("script"),
+                }
+            )
+        return self.get("source")
+
+    def build_file_system_segments(self) -> list[str]:
+        if self.language == "html":
+            return compile_file_system(
+                [
+                    ("package.json", PACKAGE_JSON_HTML),
+                    (".mocharc.json", MOCHA_CONFIG),
+                    ("index.html", None),
+                    ("styles.css", None),
+                    ("script.js", None),
+                    ("test.js", self.get("test")),
+                ]
+            )
+        if self.language == "javascript":
+            return compile_file_system(
+                [
+                    ("source.js", None),
+                    ("package.json", PACKAGE_JSON_JAVASCRIPT),
+                    (".mocharc.json", MOCHA_CONFIG),
+                    ("test.js", self.get("test")),
+                ]
+            )
+        return compile_file_system([("source.py", None), ("test.py", self.get("test"))])
+
+
+class LessonFileCache:
+    """
+    LessonFiles of lazily loaded lessons, least recently used first and
+    bounded by the total length of their bodies. An access compares the
+    files' modification times, at most once every `check_interval` seconds,
+    and reloads the lesson if any changed.
+    """
+
+    def __init__(self, max_size: int, check_interval: float = 1.0):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, lesson) -> LessonFiles:
+        now = time.monotonic()
+        with self._lock:
+            files = self._entries.get(lesson)
+            if files is not None and now - files.checked_at < self.check_interval:
+                self._entries.move_to_end(lesson)
+                self.hits += 1
+                return files
+
+        mtimes = get_mtimes(lesson.directory, LESSON_FILENAMES.get(lesson.language, {}))
+
+        with self._lock:
+            if files is not None and files.mtimes == mtimes:
+                files.checked_at = now
+                self._entries.move_to_end(lesson)
+                self.hits += 1
+                return files
+            self.misses += 1
+
+        files = LessonFiles(lesson.directory, lesson.language, mtimes)
+
+        with self._lock:
+            previous = self._entries.pop(lesson, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[lesson] = files
+            self.size += files.size
+
+            while self.size > self.max_size and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+        return files
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_size": self.max_size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+lesson_files = LessonFileCache(settings.COURSE_FILE_CACHE_SIZE)
 
 
 class Lesson:
-    def __init__(self, directory: str, parent):
+    """
+    A lesson's metadata. Navigation is by position: `ordinal` indexes the
+    parent unit's lessons, so previous and next are looked up rather than
+    stored.
+    """
+
+    __slots__ = (
+        "parent",
+        "ordinal",
+        "directory",
+        "id",
+        "title",
+        "slug",
+        "language",
+        "type",
+        "version",
+        "tests",
+        "exports",
+        "_files",
+    )
+
+    def __init__(self, directory: str, parent, lazy: bool = False):
+        metadata = read_metadata(directory)
+
         self.parent = parent
-        self.previous = None
-        self.next = None
+        self.ordinal = 0
+        self.directory = directory
+        self.title = intern_value(metadata.get("title"))
+        self.slug = intern_value(metadata.get("slug"))
+        self.language = intern_value(metadata.get("language"))
+        self.type = intern_value(metadata.get("type"))
+        self.version = intern_value(metadata.get("version"))
+        self.tests = metadata.get("tests")
+        exports = metadata.get("exports")
+        self.exports = tuple(exports) if isinstance(exports, list) else exports
+        self.id = f"{parent.link}/{self.slug}"[1:]
+
+        # Lazy lessons read their files on first use, through lesson_files.
+        self._files = None if lazy else LessonFiles(directory, self.language)
 
-        try:
-            with open(os.path.join(directory, "meta.json"), "r") as file:
-                self._metadata = file.read()
-            self._metadata = json.loads(self._metadata)
-        except FileNotFoundError:
-            raise ValueError("Could not find meta.json in %s" % directory)
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON metadata")
-
-        self.title = self._metadata.get("title")
-        self.slug = self._metadata.get("slug")
-        self.language = self._metadata.get("language")
-        self.type = self._metadata.get("type")
-        self.version = self._metadata.get("version")
-        self.tests = self._metadata.get("tests")
-        self.exports = self._metadata.get("exports")
-        self.link = f"{parent.link}/{self.slug}"
-        self.id = self.link[1:]
-
-        self.source_file = self.read_file(directory, "source")
-        self.test_file = self.read_file(directory, "test")
-        self.instructions_file = self.read_file(directory, "instructions")
+    @property
+    def link(self) -> str:
+        return "/" + self.id
 
-        if self.language == "html":
-            self.style_file = self.read_file(directory, "style")
-            self.script_file = self.read_file(directory, "script")
-
-    def read_file(self, directory: str, file_type: str):
-        filename_by_type = {
-            "html": {
-                "instructions": "instructions.md",
-                "source": "source.html",
-                "style": "styles.css",
-                "script": "script.js",
-                "test": "test.js",
-            },
-            "javascript": {
-                "instructions": "instructions.md",
-                "source": "source.js",
-                "test": "test.js",
-            },
-            "python": {
-                "instructions": "instructions.md",
-                "source": "source.py",
-                "test": "test.py",
-            },
-        }
-
-        filename = filename_by_type.get(self.language, {}).get(file_type)
-
-        if not filename:
-            return ""
-
-        path = os.path.join(directory, filename)
+    @property
+    def previous(self):
+        return self.parent.get_lessons()[self.ordinal - 1] if self.ordinal else None
 
-        try:
-            with open(path, "r") as file:
-                return file.read()
-        except FileNotFoundError:
-            return ""
+    @property
+    def next(self):
+        lessons = self.parent.get_lessons()
+        return lessons[self.ordinal + 1] if self.ordinal + 1 < len(lessons) else None
+
+    @property
+    def files(self) -> LessonFiles:
+        if self._files is not None:
+            return self._files
+        return lesson_files.get(self)
+
+    @property
+    def source_file(self) -> str:
+        return self.files.get("source")
+
+    @property
+    def test_file(self) -> str:
+        return self.files.get("test")
+
+    @property
+    def instructions_file(self) -> str:
+        return self.files.get("instructions")
+
+    @property
+    def style_file(self) -> str:
+        return self.files.get("style")
 
-    def create_file_system(self, saved_code: str | None):
+    @property
+    def script_file(self) -> str:
+        return self.files.get("script")
+
+    @property
+    def starter_code(self) -> str:
+        return self.files.starter_code
+
+    def create_file_system(self, saved_code: str | None) -> str:
+        """
+        The WebContainer file system tree for this lesson as script-safe JSON.
+        Only the files holding the student's code are serialized per call.
+        """
         if self.type == "repl":
-            return {}
+            return "{}"
+        files = self.files
         if self.language == "html":
-            return self.create_file_system_html(saved_code)
-        if self.language == "javascript":
-            return self.create_file_system_javascript(saved_code)
-        if self.language == "python":
-            return self.create_file_system_python(saved_code)
-
-    def create_file_system_html(self, saved_code: str | None):
+            return self.create_file_system_html(files, saved_code)
+        if self.language in ("javascript", "python"):
+            return fill_file_system(
+                files.file_system_segments, [saved_code or files.get("source")]
+            )
+        return "null"
+
+    def create_file_system_html(
+        self, files: LessonFiles, saved_code: str | None
+    ) -> str:
         try:
             parsed_saved_code = json.loads(saved_code or "")
         except json.JSONDecodeError:
             parsed_saved_code = {"html": saved_code, "css": "", "js": ""}
 
-        packageJSON = json.dumps(
-            {
-                "name": "codilla",
-                "type": "module",
-                "dependencies": {
-                    "chai": "^5.1.1",
-                    "mocha": "^10.6.0",
-                    "vite": "^5.4.0",
-                },
-                "scripts": {
-                    "test": "mocha test.js",
-                    "start": "vite --port 3111",
-                },
-            }
-        )
-
-        mochaConfig = json.dumps(
-            {"reporter": "json", "reporterOptions": ["output=./test-results.json"]}
-        )
-
-        return {
-            "package.json": {
-                "file": {
-                    "contents": packageJSON,
-                },
-            },
-            ".mocharc.json": {
-                "file": {
-                    "contents": mochaConfig,
-                },
-            },
-            "index.html": {
-                "file": {
-                    "contents": parsed_saved_code["html"] or self.source_file,
-                },
-            },
-            "styles.css": {
-                "file": {
-                    "contents": parsed_saved_code["css"] or self.style_file,
-                },
-            },
-            "script.js": {
-                "file": {
-                    "contents": parsed_saved_code["js"] or self.script_file,
-                },
-            },
-            "test.js": {
-                "file": {
-                    "contents": self.test_file,
-                },
-            },
-        }
-
-    def create_file_system_javascript(self, saved_code: str | None):
-        mochaConfig = json.dumps(
-            {"reporter": "json", "reporterOptions": ["output=./test-results.json"]}
-        )
+        if not isinstance(parsed_saved_code, dict):
+            parsed_saved_code = {"html": saved_code, "css": "", "js": ""}
 
-        packageJSON = json.dumps(
-            {
-                "name": "codilla",
-                "type": "module",
-                "dependencies": {
-                    "chai": "^5.1.1",
-                    "mocha": "^10.6.0",
-                },
-                "scripts": {
-                    "test": "mocha test.js",
-                },
-            }
+        return fill_file_system(
+            files.file_system_segments,
+            [
+                parsed_saved_code.get("html") or files.get("source"),
+                parsed_saved_code.get("css") or files.get("style"),
+                parsed_saved_code.get("js") or files.get("script"),
+            ],
         )
 
-        return {
-            "source.js": {
-                "file": {
-                    "contents": saved_code or self.source_file,
-                },
-            },
-            "package.json": {
-                "file": {
-                    "contents": packageJSON,
-                },
-            },
-            ".mocharc.json": {
-                "file": {
-                    "contents": mochaConfig,
-                },
-            },
-            "test.js": {
-                "file": {
-                    "contents": self.test_file,
-                },
-            },
-        }
-
-    def create_file_system_python(self, saved_code: str | None):
-        return {
-            "source.py": {
-                "file": {
-                    "contents": saved_code or self.source_file,
-                },
-            },
-            "test.py": {
-                "file": {
-                    "contents": self.test_file,
-                },
-            },
-        }
-
 
 class Unit:
+    __slots__ = (
+        "parent",
+        "ordinal",
+        "title",
+        "slug",
+        "_lessons",
+        "_lessons_by_slug",
+        "_layout",
+    )
+
     def __init__(self, directory: str, parent):
+        metadata = read_metadata(directory)
+
         self.parent = parent
-        self.previous = None
-        self.next = None
+        self.ordinal = 0
+        self.title = intern_value(metadata.get("title"))
+        self.slug = intern_value(metadata.get("slug"))
+        self._lessons = []
+        self._lessons_by_slug = {}
+        self._layout = None
 
-        try:
-            with open(os.path.join(directory, "meta.json"), "r") as file:
-                self._metadata = file.read()
-            self._metadata = json.loads(self._metadata)
-        except FileNotFoundError:
-            raise ValueError("Could not find meta.json in %s" % directory)
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON metadata")
+    @property
+    def link(self) -> str:
+        return f"{self.parent.link}/{self.slug}"
 
-        self.title = self._metadata.get("title")
-        self.slug = self._metadata.get("slug")
-        self.link = f"{parent.link}/{self.slug}"
-        self._lessons = []
+    @property
+    def previous(self):
+        return self.parent.get_units()[self.ordinal - 1] if self.ordinal else None
+
+    @property
+    def next(self):
+        units = self.parent.get_units()
+        return units[self.ordinal + 1] if self.ordinal + 1 < len(units) else None
 
     def add_lesson(self, lesson: Lesson):
-        if len(self._lessons) > 0:
-            lesson.previous = self._lessons[-1]
-            self._lessons[-1].next = lesson
+        if lesson.slug in self._lessons_by_slug:
+            raise ValueError(
+                "Duplicate lesson slug %s in %s" % (lesson.slug, self.link)
+            )
+        lesson.ordinal = len(self._lessons)
         self._lessons.append(lesson)
+        self._lessons_by_slug[lesson.slug] = lesson
+        self._layout = None
 
     def get_lesson(self, slug: str):
-        for lesson in self._lessons:
-            if lesson.slug == slug:
-                return lesson
+        return self._lessons_by_slug.get(slug)
 
     def get_lessons(self):
         return self._lessons
 
+    @property
+    def layout(self):
+        """
+        Identifies the order of lessons in the unit. Lesson ordinals are only
+        comparable between two units with the same layout.
+        """
+        if self._layout is None:
+            slugs = "\n".join(lesson.slug for lesson in self._lessons)
+            self._layout = hashlib.sha256(slugs.encode()).hexdigest()[:16]
+        return self._layout
+
     @property
     def number_of_lessons(self):
         return len(self._lessons)
 
 
 class Course:
-    def __init__(self, directory: str):
-        try:
-            with open(os.path.join(directory, "meta.json"), "r") as file:
-                self._metadata = file.read()
-            self._metadata = json.loads(self._metadata)
-        except FileNotFoundError:
-            raise ValueError("Could not find meta.json in %s" % directory)
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON metadata")
+    __slots__ = (
+        "directory",
+        "title",
+        "slug",
+        "version",
+        "outline",
+        "_units",
+        "_units_by_slug",
+    )
 
-        self.title = self._metadata.get("title")
-        self.slug = self._metadata.get("slug")
-        self.version = self._metadata.get("version")
-        self.link = f"/{self.slug}"
+    def __init__(self, directory: str):
+        metadata = read_metadata(directory)
+
+        self.directory = directory
+        self.title = intern_value(metadata.get("title"))
+        self.slug = intern_value(metadata.get("slug"))
+        self.version = intern_value(metadata.get("version"))
+        # The lesson links of the course page; see navigation.py.
+        self.outline = None
         self._units = []
+        self._units_by_slug = {}
 
-    def add_unit(self, unit):
-        if len(self._units) > 0:
-            unit.previous = self._units[-1]
-            self._units[-1].next = unit
+    @property
+    def link(self) -> str:
+        return f"/{self.slug}"
+
+    def add_unit(self, unit: Unit):
+        if unit.slug in self._units_by_slug:
+            raise ValueError(
+                "Duplicate unit slug %s in %s" % (unit.slug, self.link)
+            )
+        unit.ordinal = len(self._units)
         self._units.append(unit)
+        self._units_by_slug[unit.slug] = unit
 
     def get_lesson(self, unit_slug: str, lesson_slug: str):
         unit = self.get_unit(unit_slug)
@@ -264,9 +568,7 @@ class Course:
         return unit.get_lesson(lesson_slug)
 
     def get_unit(self, slug: str):
-        for unit in self._units:
-            if unit.slug == slug:
-                return unit
+        return self._units_by_slug.get(slug)
 
     def get_units(self):
         return self._units
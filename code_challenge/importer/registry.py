@@ -0,0 +1,75 @@
+import threading
+from collections.abc import Mapping
+from ..importer.parsers import Course, Lesson
+
+
+class CourseRegistry(Mapping):
+    """
+    Courses by slug, plus a flat index of every lesson by its id
+    ("course/unit/lesson").
+
+    Both maps are swapped together in a single assignment, so readers see
+    either the old or the new set of courses, never a mix of the two.
+    """
+
+    def __init__(self, courses: dict[str, Course]):
+        self._lock = threading.Lock()
+        self._set(courses)
+
+    def _set(self, courses: dict[str, Course]):
+        lessons = {
+            lesson.id: lesson
+            for course in courses.values()
+            for unit in course.get_units()
+            for lesson in unit.get_lessons()
+        }
+        self._state = (courses, lessons)
+
+    def __getitem__(self, slug: str) -> Course:
+        return self._state[0][slug]
+
+    def __iter__(self):
+        return iter(self._state[0])
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def get_lesson(self, lesson_id: str) -> Lesson | None:
+        return self._state[1].get(lesson_id)
+
+    def get_starter_code(self, lesson_id: str) -> str | None:
+        lesson = self.get_lesson(lesson_id)
+        return lesson.starter_code if lesson else None
+
+    def replace(self, course: Course, previous: Course | None = None):
+        """
+        Add `course`, or swap it in for `previous`, which may have had a
+        different slug.
+        """
+        with self._lock:
+            current = self._state[0]
+
+            existing = current.get(course.slug)
+            if existing is not None and existing is not previous:
+                raise ValueError(
+                    "Duplicate course slug %s in %s" % (course.slug, course.directory)
+                )
+
+            courses = {}
+            for slug, existing in current.items():
+                if existing is previous:
+                    courses[course.slug] = course
+                else:
+                    courses[slug] = existing
+            courses.setdefault(course.slug, course)
+
+            self._set(courses)
+
+    def remove(self, course: Course):
+        with self._lock:
+            courses = {
+                slug: existing
+                for slug, existing in self._state[0].items()
+                if existing is not course
+            }
+            self._set(courses)
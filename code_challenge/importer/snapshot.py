@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+
+MAGIC = b"CODILLA\x00"
+FORMAT_VERSION = 5
+HEADER = struct.Struct(">8sH")
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stat_course_files(course_dir: str, prefix: str = ""):
+    """
+    Yield (relative path, path, stat) for every file in a course directory,
+    in sorted order, skipping hidden files and directories.
+    """
+    with os.scandir(course_dir) as scan:
+        entries = sorted(
+            (entry for entry in scan if not entry.name.startswith(".")),
+            key=lambda entry: entry.name,
+        )
+
+    # Files first, then subdirectories, as os.walk orders them.
+    directories = []
+    for entry in entries:
+        if entry.is_dir():
+            directories.append(entry)
+        else:
+            yield prefix + entry.name, entry.path, entry.stat()
+
+    for entry in directories:
+        yield from stat_course_files(entry.path, f"{prefix}{entry.name}{os.sep}")
+
+
+def hash_course_files(course_dir: str, previous: dict | None = None) -> dict:
+    """
+    {relative path: [size, mtime_ns, sha256]} for every file in a course
+    directory. Files whose size and modification time match their entry in
+    `previous` keep its hash instead of being read again.
+    """
+    previous = previous or {}
+    files = {}
+
+    for name, path, stat in stat_course_files(course_dir):
+        entry = previous.get(name)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            files[name] = entry
+        else:
+            files[name] = [stat.st_size, stat.st_mtime_ns, hash_file(path)]
+
+    return files
+
+
+def is_course_unchanged(course_dir: str, files: dict) -> bool:
+    """
+    Whether a course directory holds exactly the files of a manifest entry
+    from hash_course_files(), with the same sizes and modification times.
+    Only stats the files.
+    """
+    count = 0
+    try:
+        for name, _, stat in stat_course_files(course_dir):
+            entry = files.get(name)
+            if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+                return False
+            count += 1
+    except FileNotFoundError:
+        return False
+    return count == len(files)
+
+
+def get_files_digest(files: dict) -> str:
+    """
+    Hash of the paths and contents of the files from hash_course_files().
+    """
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(name.encode())
+        digest.update(b"\0")
+        digest.update(files[name][2].encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(path, "r") as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    if manifest.get("format") != FORMAT_VERSION:
+        return {}
+    return manifest
+
+
+def write_manifest(path: str, manifest: dict):
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "w") as file:
+        json.dump({"format": FORMAT_VERSION, **manifest}, file, indent=1)
+
+    os.replace(tmp_path, path)
+
+
+def write_snapshot(path: str, entries: dict):
+    """
+    Write {course directory name: (content hash, Course)} to a snapshot file.
+    """
+    payload = pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION))
+        file.write(payload)
+
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> dict | None:
+    """
+    Return the entries stored in a snapshot file, or None if the file is
+    missing or was written by an incompatible format version.
+    """
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return None
+
+    if len(data) < HEADER.size:
+        return None
+
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+
+    return pickle.loads(memoryview(data)[HEADER.size :])
@@ -0,0 +1,74 @@
+import re
+from ..importer.loader import get_lesson_dirs, get_unit_dirs
+from ..importer.parsers import LESSON_FILENAMES, read_metadata
+
+# Lesson types views.LESSON_TEMPLATES can render.
+LESSON_TYPES = ("editor", "repl", "playground")
+
+# Slugs end up in URLs matched by Django's <slug:> converter.
+SLUG_PATTERN = re.compile(r"[-a-zA-Z0-9_]+\Z")
+
+COURSE_FIELDS = UNIT_FIELDS = ("title", "slug")
+LESSON_FIELDS = ("title", "slug", "language", "type")
+
+
+def check_metadata(directory: str, fields: tuple, errors: list[str]) -> dict | None:
+    try:
+        metadata = read_metadata(directory)
+    except ValueError as error:
+        errors.append(f"{directory}: {error}")
+        return None
+
+    if not isinstance(metadata, dict):
+        errors.append(f"{directory}: meta.json must hold an object")
+        return None
+
+    for field in fields:
+        if not isinstance(metadata.get(field), str) or not metadata[field]:
+            errors.append(f"{directory}: meta.json has no {field}")
+
+    slug = metadata.get("slug")
+    if isinstance(slug, str) and slug and not SLUG_PATTERN.match(slug):
+        errors.append(f"{directory}: invalid slug {slug!r}")
+
+    return metadata
+
+
+def check_duplicate(metadata, directory: str, seen: dict, errors: list[str]):
+    slug = metadata.get("slug") if metadata else None
+    if not isinstance(slug, str):
+        return
+    if slug in seen:
+        errors.append(f"{directory}: slug {slug} is also used by {seen[slug]}")
+    else:
+        seen[slug] = directory
+
+
+def validate_course(course_dir: str) -> list[str]:
+    """
+    Every problem that would stop the course from loading or a lesson from
+    rendering, as "directory: message" strings.
+    """
+    errors = []
+    check_metadata(course_dir, COURSE_FIELDS, errors)
+
+    unit_slugs = {}
+    for unit_dir in get_unit_dirs(course_dir):
+        unit = check_metadata(unit_dir, UNIT_FIELDS, errors)
+        check_duplicate(unit, unit_dir, unit_slugs, errors)
+
+        lesson_slugs = {}
+        for lesson_dir in get_lesson_dirs(unit_dir):
+            lesson = check_metadata(lesson_dir, LESSON_FIELDS, errors)
+            if lesson is None:
+                continue
+            check_duplicate(lesson, lesson_dir, lesson_slugs, errors)
+
+            language = lesson.get("language")
+            if isinstance(language, str) and language not in LESSON_FILENAMES:
+                errors.append(f"{lesson_dir}: unknown language {language}")
+            lesson_type = lesson.get("type")
+            if isinstance(lesson_type, str) and lesson_type not in LESSON_TYPES:
+                errors.append(f"{lesson_dir}: unknown lesson type {lesson_type}")
+
+    return errors
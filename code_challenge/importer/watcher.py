@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from ..importer.build_courses import build_course, courses, get_course_dirs
+from ..importer.registry import CourseRegistry
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+
+class CourseWatcher:
+    """
+    Watches COURSE_ROOT and rebuilds a course in the background whenever
+    anything in its directory changes, then swaps it into the registry.
+
+    Uses inotify when inotify_simple is installed and falls back to polling
+    file modification times otherwise.
+    """
+
+    def __init__(self, registry: CourseRegistry, root: str, interval: float):
+        self.registry = registry
+        self.root = root
+        self.interval = interval
+        self._signatures = {}
+
+    def start(self):
+        threading.Thread(target=self.run, name="course-watcher", daemon=True).start()
+
+    def run(self):
+        # A course that changes during this first pass is left out and gets
+        # reloaded by the next one instead of killing the thread.
+        self._signatures.update(self.get_changed())
+
+        if INotify is not None:
+            try:
+                self.watch()
+                return
+            except OSError:
+                logger.exception("inotify unavailable, polling %s", self.root)
+
+        self.poll()
+
+    def poll(self):
+        while True:
+            time.sleep(self.interval)
+            self.reload(self.get_changed())
+
+    def watch(self):
+        inotify = INotify()
+        mask = (
+            flags.CREATE
+            | flags.DELETE
+            | flags.MODIFY
+            | flags.CLOSE_WRITE
+            | flags.MOVED_FROM
+            | flags.MOVED_TO
+        )
+        self.add_watches(inotify, mask)
+
+        while True:
+            inotify.read()
+            # Let a burst of writes (a git pull) settle before rebuilding.
+            while inotify.read(timeout=int(self.interval * 1000)):
+                pass
+            self.add_watches(inotify, mask)
+            self.reload(self.get_changed())
+
+    def add_watches(self, inotify, mask):
+        # Adding a watch to an already watched directory is a no-op.
+        for root, dirs, _ in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            try:
+                inotify.add_watch(root, mask)
+            except FileNotFoundError:
+                pass
+
+    def get_signature(self, course_dir: str):
+        signature = []
+        for root, dirs, files in os.walk(course_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for filename in sorted(files):
+                stat = os.stat(os.path.join(root, filename))
+                signature.append((root, filename, stat.st_mtime_ns, stat.st_size))
+        return signature
+
+    def get_changed(self) -> dict:
+        course_dirs = set(get_course_dirs(self.root)) | set(self._signatures)
+        changed = {}
+
+        for course_dir in sorted(course_dirs):
+            try:
+                signature = self.get_signature(course_dir)
+            except FileNotFoundError:
+                # Changed again while we looked; pick it up next time.
+                continue
+            if signature != self._signatures.get(course_dir):
+                changed[course_dir] = signature
+
+        return changed
+
+    def reload(self, changed: dict):
+        for course_dir, signature in changed.items():
+            # Only retry a broken course once its files change again.
+            self._signatures[course_dir] = signature
+            previous = self.find_course(course_dir)
+            start = time.perf_counter()
+
+            try:
+                if os.path.isdir(course_dir):
+                    course = build_course(course_dir)
+                    self.registry.replace(course, previous)
+                elif previous:
+                    self.registry.remove(previous)
+            except (OSError, ValueError):
+                # Keep serving the last good version until the author fixes it.
+                logger.exception("Failed to reload course %s", course_dir)
+                continue
+
+            logger.info(
+                "Reloaded course %s in %.3fs",
+                os.path.basename(course_dir),
+                time.perf_counter() - start,
+            )
+
+    def find_course(self, course_dir: str):
+        name = os.path.basename(course_dir)
+        for course in self.registry.values():
+            if os.path.basename(course.directory) == name:
+                return course
+        return None
+
+
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def start_watcher(**kwargs):
+    """
+    Start watching COURSE_ROOT once per process. Connected to request_started
+    so that each forked worker starts its own thread.
+    """
+    global _started_pid
+
+    if _started_pid == os.getpid():
+        return
+
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+
+    CourseWatcher(
+        courses, settings.COURSE_ROOT, settings.COURSE_RELOAD_INTERVAL
+    ).start()
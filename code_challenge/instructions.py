@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import markdown
+import pygments
+from markdown.extensions.codehilite import CodeHiliteExtension
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+CODEHILITE_CONFIG = {"noclasses": True, "pygments_style": "dracula"}
+
+# Anything that changes the rendered output must be part of the cache key.
+CONFIG_KEY = repr(
+    (
+        "fenced_code",
+        ("codehilite", sorted(CODEHILITE_CONFIG.items())),
+        "attr_list",
+        "extra",
+        markdown.__version__,
+        pygments.__version__,
+    )
+).encode()
+
+
+def render_markdown(code: str) -> str:
+    return markdown.markdown(
+        code,
+        extensions=[
+            "fenced_code",
+            CodeHiliteExtension(**CODEHILITE_CONFIG),
+            "attr_list",
+            "extra",
+        ],
+    )
+
+
+class InstructionsCache:
+    """
+    Rendered instruction HTML. The in-memory LRU is keyed by the markdown
+    source itself (str hashes are cached, so a hit is a plain dict lookup);
+    the optional on-disk tier is keyed by a hash of the source and the
+    extension config, survives restarts and is shared by every worker.
+
+    The disk tier also records which key each lesson last used, and removes
+    the file of the previous one when a lesson's instructions change.
+    """
+
+    def __init__(self, max_entries: int, directory: str | None = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_key(self, source: str) -> str:
+        return hashlib.sha256(CONFIG_KEY + b"\0" + source.encode()).hexdigest()
+
+    def get(self, source: str, lesson_id: str | None = None) -> str:
+        with self._lock:
+            html = self._entries.get(source)
+            if html is not None:
+                self._entries.move_to_end(source)
+                return html
+
+        key = self.get_key(source)
+        html = self._read(key)
+        if html is None:
+            html = render_markdown(source)
+            self._write(key, html)
+        if lesson_id:
+            self._prune(lesson_id, key)
+
+        with self._lock:
+            self._entries[source] = html
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return html
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.html")
+
+    def _get_lesson_path(self, lesson_id: str) -> str:
+        return os.path.join(self.directory, "lessons", *lesson_id.split("/"))
+
+    def _read(self, key: str) -> str | None:
+        if not self.directory:
+            return None
+
+        try:
+            with open(self._get_path(key), "r") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, html: str):
+        if self.directory:
+            self._write_file(self._get_path(key), html)
+
+    def _write_file(self, path: str, content: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The disk tier is an optimization; serve from memory regardless.
+            pass
+
+    def _prune(self, lesson_id: str, key: str):
+        """
+        Remove the file of the key a lesson used before, if it changed. Another
+        lesson with the same instructions just renders them again.
+        """
+        if not self.directory:
+            return
+
+        path = self._get_lesson_path(lesson_id)
+        try:
+            with open(path, "r") as file:
+                previous = file.read()
+        except FileNotFoundError:
+            previous = None
+
+        if previous == key:
+            return
+
+        self._write_file(path, key)
+        if previous:
+            try:
+                os.remove(self._get_path(previous))
+            except OSError:
+                pass
+
+
+instructions_cache = InstructionsCache(
+    settings.INSTRUCTIONS_CACHE_SIZE, settings.INSTRUCTIONS_CACHE_DIR
+)
+
+
+@receiver(setting_changed)
+def update_instructions_cache(*, setting, value, **kwargs):
+    if setting == "INSTRUCTIONS_CACHE_DIR":
+        instructions_cache.directory = value
+
+
+def render_instructions(lesson) -> str:
+    return instructions_cache.get(lesson.instructions_file, lesson.id)
@@ -1,22 +1,204 @@
+const SAVE_DELAY_MS = 1500;
+// Queued operations are stored per user, so that on a shared computer they
+// are only ever sent for the student who made them.
+const QUEUE_STORAGE_PREFIX = "codilla:queued-operations";
+// Matches MAX_BATCH_OPERATIONS in code_challenge/api.py
+const MAX_BATCH_OPERATIONS = 200;
+
+type Operation = {
+  op: "complete" | "reset" | "save";
+  lesson_id: string;
+  code?: string;
+};
+
+/**
+ * 32-bit FNV-1a. Only used to tell whether code changed since the last save,
+ * so collisions merely cost a skipped save of otherwise identical code.
+ */
+function hashCode(code: string) {
+  let hash = 0x811c9dc5;
+  for (let i = 0; i < code.length; i++) {
+    hash ^= code.charCodeAt(i);
+    hash = Math.imul(hash, 0x01000193);
+  }
+  return hash >>> 0;
+}
+
 export class API {
   apiRoot: string;
   csrfToken: string;
+  userId: number | null;
 
-  constructor({ csrfToken }: { csrfToken: string }) {
+  private savedHashes: Map<string, number>;
+  private pendingSaves: Map<string, { code: string; timer: number }>;
+  private latestOperations: Map<string, Operation>;
+  private sending: Promise<void>;
+  private sendingCount: number;
+
+  constructor({
+    csrfToken,
+    userId,
+  }: {
+    csrfToken: string;
+    userId: number | null;
+  }) {
     this.apiRoot = "/codilla/api/challenge";
     this.csrfToken = csrfToken;
+    this.userId = userId;
+    this.savedHashes = new Map();
+    this.pendingSaves = new Map();
+    this.latestOperations = new Map();
+    this.sending = Promise.resolve();
+    this.sendingCount = 0;
+
+    window.addEventListener("pagehide", () => this.flushSaves());
+    window.addEventListener("online", () => this.flushQueue());
+    this.flushQueue();
   }
 
   async markComplete(lesson_id: string, code: string) {
-    this.callApi("complete", { code, lesson_id }, { method: "PUT" });
+    this.cancelSave(lesson_id);
+    await this.callApi("complete", { code, lesson_id }, { method: "PUT" });
   }
 
   async reset(lesson_id: string) {
-    this.callApi("reset", { lesson_id }, { method: "PUT" });
+    this.cancelSave(lesson_id);
+    await this.callApi("reset", { lesson_id }, { method: "PUT" });
   }
 
+  /**
+   * Save immediately, unless the code is unchanged since the last save.
+   */
   async save(lesson_id: string, code: string) {
-    await this.callApi("save", { code, lesson_id }, { method: "PUT" });
+    this.cancelSave(lesson_id);
+    await this.sendSave(lesson_id, code);
+  }
+
+  /**
+   * Save after SAVE_DELAY_MS. Repeated calls for the same lesson within the
+   * delay coalesce into a single request carrying the latest code.
+   */
+  queueSave(lesson_id: string, code: string) {
+    this.cancelSave(lesson_id);
+
+    const timer = window.setTimeout(() => {
+      this.pendingSaves.delete(lesson_id);
+      this.sendSave(lesson_id, code);
+    }, SAVE_DELAY_MS);
+
+    this.pendingSaves.set(lesson_id, { code, timer });
+  }
+
+  flushSaves() {
+    for (const [lesson_id, { code }] of this.pendingSaves) {
+      this.cancelSave(lesson_id);
+      this.sendSave(lesson_id, code, { keepalive: true });
+    }
+  }
+
+  /**
+   * Send operations that could not be delivered earlier (offline, flaky
+   * network) to the batch endpoint, in order and in as few requests as
+   * possible. They are only dropped once the server accepted them for the
+   * user who queued them.
+   */
+  flushQueue() {
+    return this.schedule(() => this.drainQueue());
+  }
+
+  private async drainQueue() {
+    while (this.userId !== null && navigator.onLine) {
+      const queued = this.readQueue();
+      if (!queued.length) {
+        return;
+      }
+
+      const operations = queued.slice(0, MAX_BATCH_OPERATIONS);
+      this.writeQueue(queued.slice(MAX_BATCH_OPERATIONS));
+
+      try {
+        const response = await fetch(`${this.apiRoot}/batch`, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            "X-CSRFToken": this.csrfToken,
+          },
+          body: JSON.stringify({ operations, user_id: this.userId }),
+        });
+        // Client errors will not succeed on retry, so only requeue on 5xx,
+        // or on 403 if the user was logged out or another user logged in.
+        if (response.status >= 500 || response.status === 403) {
+          throw new Error(`Batch failed with status ${response.status}`);
+        }
+      } catch (error) {
+        this.writeQueue([...operations, ...this.readQueue()]);
+        return;
+      }
+    }
+  }
+
+  /**
+   * Run `task` once every operation started before it has settled. The
+   * server orders writes by when they arrive, so this keeps an operation
+   * that failed and was queued from landing after a newer one.
+   */
+  private schedule(task: () => Promise<void>) {
+    this.sendingCount++;
+    const next = this.sending.then(task).finally(() => this.sendingCount--);
+    this.sending = next.catch(() => {});
+    return next;
+  }
+
+  private getQueueKey() {
+    return `${QUEUE_STORAGE_PREFIX}:${this.userId}`;
+  }
+
+  private readQueue(): Operation[] {
+    try {
+      return JSON.parse(localStorage.getItem(this.getQueueKey()) || "[]");
+    } catch (error) {
+      return [];
+    }
+  }
+
+  private writeQueue(operations: Operation[]) {
+    if (operations.length) {
+      localStorage.setItem(this.getQueueKey(), JSON.stringify(operations));
+    } else {
+      localStorage.removeItem(this.getQueueKey());
+    }
+  }
+
+  private enqueue(operation: Operation) {
+    // Anonymous progress is not saved, so there is nothing to retry.
+    if (this.userId === null) {
+      return;
+    }
+    this.writeQueue([...this.readQueue(), operation]);
+  }
+
+  private cancelSave(lesson_id: string) {
+    const pending = this.pendingSaves.get(lesson_id);
+    if (pending) {
+      window.clearTimeout(pending.timer);
+      this.pendingSaves.delete(lesson_id);
+    }
+  }
+
+  private async sendSave(
+    lesson_id: string,
+    code: string,
+    options: { keepalive?: boolean } = {},
+  ) {
+    if (this.savedHashes.get(lesson_id) === hashCode(code)) {
+      return;
+    }
+
+    await this.callApi(
+      "save",
+      { code, lesson_id },
+      { method: "PUT", keepalive: options.keepalive },
+    );
   }
 
   private getApiPath(op: string) {
@@ -29,18 +211,51 @@ export class API {
     return `${this.apiRoot}${pathMap[op]}`;
   }
 
-  private async callApi(
-    op: "complete" | "reset" | "save",
-    payload: object,
-    options: { method?: string },
+  private callApi(
+    op: Operation["op"],
+    payload: { lesson_id: string; code?: string },
+    options: { method?: string; keepalive?: boolean },
   ) {
-    fetch(this.getApiPath(op), {
-      method: options.method || "POST",
-      headers: {
-        "Content-Type": "application/json",
-        "X-CSRFToken": this.csrfToken,
-      },
-      body: JSON.stringify(payload),
+    const operation = { op, ...payload };
+    // Until it is known to be stored, the server may not have this code.
+    this.savedHashes.delete(payload.lesson_id);
+    this.latestOperations.set(payload.lesson_id, operation);
+
+    // The page is going away and cannot wait for earlier operations, so
+    // leave this one for the next page load to send after them.
+    if (options.keepalive && (this.sendingCount || this.readQueue().length)) {
+      this.enqueue(operation);
+      return Promise.resolve();
+    }
+
+    return this.schedule(async () => {
+      // Never overtake operations still waiting to be sent.
+      if (!navigator.onLine || this.readQueue().length) {
+        this.enqueue(operation);
+        await this.drainQueue();
+        return;
+      }
+
+      try {
+        const response = await fetch(this.getApiPath(op), {
+          method: options.method || "POST",
+          headers: {
+            "Content-Type": "application/json",
+            "X-CSRFToken": this.csrfToken,
+          },
+          body: JSON.stringify(payload),
+          keepalive: options.keepalive,
+        });
+        if (response.status >= 500) {
+          throw new Error(`Request failed with status ${response.status}`);
+        }
+        const latest = this.latestOperations.get(payload.lesson_id);
+        if (response.ok && latest === operation && payload.code !== undefined) {
+          this.savedHashes.set(payload.lesson_id, hashCode(payload.code));
+        }
+      } catch (error) {
+        this.enqueue(operation);
+      }
     });
   }
 }
@@ -52,7 +52,7 @@ export class CodeContainer {
 
   async run() {
     if (this.meta.user.authenticated) {
-      this.save();
+      this.api.queueSave(this.meta.lesson_id, this.io.editorState);
     }
     this.io.clearOutput();
 
@@ -112,7 +112,7 @@ export class CodeContainer {
         this.api.markComplete(this.meta.lesson_id, this.io.editorState);
       }
     } else {
-      this.api.save(this.meta.lesson_id, this.io.editorState);
+      this.api.queueSave(this.meta.lesson_id, this.io.editorState);
     }
 
     return passed;
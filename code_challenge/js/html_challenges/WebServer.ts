@@ -92,7 +92,7 @@ export class WebServer {
   async run() {
     try {
       await this.writeSource();
-      this.save();
+      this.api.queueSave(this.meta.lesson_id, this.packCode());
     } catch (error) {
       this.htmlIO.logger(error?.message || "Something went wrong");
     }
@@ -160,7 +160,7 @@ export class WebServer {
         this.api.markComplete(this.meta.lesson_id, this.packCode());
       }
     } else {
-      this.api.save(this.meta.lesson_id, this.packCode());
+      this.api.queueSave(this.meta.lesson_id, this.packCode());
     }
 
     return passed;
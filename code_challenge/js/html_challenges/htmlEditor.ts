@@ -139,7 +139,7 @@ const jsIO = new IO({
 /*****************************************************
  * API setup
  ****************************************************/
-const api = new API({ csrfToken });
+const api = new API({ csrfToken, userId: metaJSON.user.id });
 
 /*****************************************************
  * Container setup
@@ -95,7 +95,7 @@ const io = new IO({
 /*****************************************************
  * API setup
  ****************************************************/
-const api = new API({ csrfToken });
+const api = new API({ csrfToken, userId: metaJSON.user.id });
 
 /*****************************************************
  * Init pyodide
@@ -34,7 +34,7 @@ const next_lesson_link = metaJSON?.next_lesson?.link || "";
 /*****************************************************
  * API setup
  ****************************************************/
-const api = new API({ csrfToken });
+const api = new API({ csrfToken, userId: metaJSON.user.id });
 
 /*****************************************************
  * Create shell and launch Node REPL
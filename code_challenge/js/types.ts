@@ -24,6 +24,7 @@ export type MetaJSON = {
   starter_code: string;
   user: {
     authenticated: boolean;
+    id: number | null;
   };
 };
 
@@ -0,0 +1,60 @@
+from django.utils.safestring import mark_safe
+from .importer.parsers import Lesson, to_script_json
+from .instructions import render_instructions
+from .navigation import get_navigation
+
+
+def build_lesson_context(lesson: Lesson):
+    """
+    The request-independent part of a lesson page: the challenge metadata
+    and its serialized meta-json prefix (without the closing brace).
+    """
+    challenge = {
+        "title": lesson.title,
+        "lesson_id": lesson.id,
+        "language": lesson.language,
+        "has_tests": lesson.tests,
+        "exports": lesson.exports,
+        "starter_code": lesson.starter_code,
+        "instructions": render_instructions(lesson),
+        **get_navigation(lesson),
+    }
+    return challenge, to_script_json(challenge)[:-1]
+
+
+def get_lesson_context(lesson: Lesson):
+    """
+    The cached lesson context. It is kept with the lesson's files, so it is
+    rebuilt when they are reloaded, and evicted with them in lazy mode.
+    """
+    files = lesson.files
+    if files.context is None:
+        files.context = build_lesson_context(lesson)
+    return files.context
+
+
+def get_request_context(lesson: Lesson, completed: bool, code: str | None, user):
+    """
+    Merge the per-request state into the cached lesson context. Returns the
+    template context, including the meta-json payload.
+    """
+    challenge, meta_prefix = get_lesson_context(lesson)
+    state = {
+        "completed": completed,
+        "user": {"authenticated": user.is_authenticated, "id": user.pk},
+    }
+    meta_json = "".join(
+        [
+            meta_prefix,
+            ", ",
+            to_script_json(state)[1:-1],
+            ', "file_system": ',
+            lesson.create_file_system(code or None),
+            "}",
+        ]
+    )
+
+    return {
+        "challenge": {**challenge, **state},
+        "meta_json": mark_safe(meta_json),
+    }
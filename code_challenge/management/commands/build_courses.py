@@ -0,0 +1,134 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from code_challenge.importer.loader import build_courses, get_course_dirs
+from code_challenge.importer.snapshot import (
+    get_files_digest,
+    hash_course_files,
+    read_manifest,
+    read_snapshot,
+    write_manifest,
+    write_snapshot,
+)
+from code_challenge.importer.validation import validate_course
+from code_challenge.instructions import render_instructions
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate COURSE_ROOT and build the snapshot workers load at startup, "
+        "with a manifest of file hashes. Only courses whose files changed "
+        "since the last build are validated and rebuilt."
+    )
+
+    # System checks load the URLconf, and with it every course, which is
+    # what a broken course must not be able to break.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.COURSE_SNAPSHOT,
+            help="Snapshot path (defaults to the COURSE_SNAPSHOT setting). The "
+            "manifest is written next to it.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild every course, even if its files are unchanged.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only validate every course; write nothing.",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        if not output and not options["check"]:
+            raise CommandError("Set COURSE_SNAPSHOT or pass --output.")
+
+        start = time.perf_counter()
+        manifest_path = f"{output}.manifest.json"
+        rebuild = options["force"] or options["check"]
+        previous = {} if rebuild else read_manifest(manifest_path).get("courses", {})
+        snapshot = {} if rebuild else read_snapshot(output) or {}
+
+        manifest = {}
+        entries = {}
+        changed = []
+        errors = []
+
+        for course_dir in get_course_dirs(settings.COURSE_ROOT):
+            name = os.path.basename(course_dir)
+            old = previous.get(name, {})
+            files = hash_course_files(course_dir, old.get("files"))
+            digest = get_files_digest(files)
+            manifest[name] = {"digest": digest, "files": files}
+
+            cached = snapshot.get(name)
+            if old.get("digest") == digest and cached and cached[0] == digest:
+                manifest[name]["lessons"] = old["lessons"]
+                entries[name] = cached
+                self.stdout.write(f"{name}: unchanged ({digest[:12]})")
+                continue
+
+            errors.extend(validate_course(course_dir))
+            changed.append(course_dir)
+            self.stdout.write(
+                f"{name}: {self.count_changes(old.get('files', {}), files)} "
+                f"files changed ({digest[:12]})"
+            )
+
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError("%d problems found; nothing written." % len(errors))
+
+        for course in build_courses(changed, lazy=False):
+            name = os.path.basename(course.directory)
+            lessons = [
+                lesson for unit in course.get_units() for lesson in unit.get_lessons()
+            ]
+            if not options["check"]:
+                for lesson in lessons:
+                    # Derived once here, then shipped in the snapshot or on disk.
+                    render_instructions(lesson)
+                    lesson.files.warm_up()
+            manifest[name]["lessons"] = [lesson.id for lesson in lessons]
+            entries[name] = (manifest[name]["digest"], course)
+
+        slugs = {}
+        for name, (_, course) in entries.items():
+            if course.slug in slugs:
+                raise CommandError(
+                    "Duplicate course slug %s in %s and %s"
+                    % (course.slug, slugs[course.slug], name)
+                )
+            slugs[course.slug] = name
+
+        if options["check"]:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(entries)} courses valid in {elapsed:.2f}s")
+            )
+            return
+
+        write_snapshot(output, entries)
+        write_manifest(manifest_path, {"courses": manifest})
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {len(entries)} courses ({len(changed)} rebuilt) to {output} "
+                f"in {elapsed:.2f}s"
+            )
+        )
+
+    def count_changes(self, old: dict, new: dict) -> int:
+        return sum(
+            1
+            for name in old.keys() | new.keys()
+            if name not in old or name not in new or old[name][2] != new[name][2]
+        )
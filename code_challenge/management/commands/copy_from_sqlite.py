@@ -0,0 +1,118 @@
+import time
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+
+SOURCE_ALIAS = "sqlite_source"
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy every table from a SQLite database into the default database, "
+        "e.g. a freshly migrated PostgreSQL database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the SQLite database file.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows to read and insert at a time.",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete rows already in the default database first.",
+        )
+
+    def handle(self, *args, **options):
+        connections.databases[SOURCE_ALIAS] = {
+            **connections.databases[DEFAULT_DB_ALIAS],
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": options["path"],
+            "OPTIONS": {},
+        }
+        source = connections[SOURCE_ALIAS]
+        target = connections[DEFAULT_DB_ALIAS]
+        if target.vendor == "sqlite":
+            raise CommandError("The default database is SQLite already.")
+
+        source.ensure_connection()
+        missing = set(target.introspection.django_table_names(only_existing=True))
+        missing -= set(source.introspection.table_names())
+        if missing:
+            raise CommandError(
+                "Migrate the SQLite database first; it lacks %s."
+                % ", ".join(sorted(missing))
+            )
+
+        models = self.get_models()
+        tables = [model._meta.db_table for model in models]
+
+        # contenttypes and permissions are recreated by migrate with their
+        # own ids, so they are always replaced by the source rows.
+        if not options["replace"] and self.has_user_data(models):
+            raise CommandError(
+                "The default database already has data; pass --replace."
+            )
+
+        start = time.perf_counter()
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            target.ops.execute_sql_flush(
+                target.ops.sql_flush(no_style(), tables, allow_cascade=True)
+            )
+
+            for model in models:
+                count = self.copy_model(model, options["batch_size"])
+                self.stdout.write(f"{model._meta.label}: {count} rows")
+
+            with target.cursor() as cursor:
+                for sql in target.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Copied {len(models)} tables in {elapsed:.2f}s")
+        )
+
+    def get_models(self):
+        # Django creates foreign keys on PostgreSQL as DEFERRABLE INITIALLY
+        # DEFERRED, so inside one transaction tables can be copied in any order.
+        return [
+            model
+            for model in apps.get_models(include_auto_created=True)
+            if model._meta.managed
+            and not model._meta.proxy
+            and router.allow_migrate_model(DEFAULT_DB_ALIAS, model)
+        ]
+
+    def has_user_data(self, models):
+        return any(
+            model._base_manager.using(DEFAULT_DB_ALIAS).exists()
+            for model in models
+            if model._meta.label not in ("contenttypes.ContentType", "auth.Permission")
+        )
+
+    def copy_model(self, model, batch_size: int) -> int:
+        """
+        Copy rows in primary key order through the ORM, so each backend
+        converts its own column types (booleans, datetimes, binary).
+        """
+        rows = model._base_manager.using(SOURCE_ALIAS).order_by("pk")
+        count = 0
+        batch = []
+
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                model._base_manager.using(DEFAULT_DB_ALIAS).bulk_create(batch)
+                count += len(batch)
+                batch = []
+
+        if batch:
+            model._base_manager.using(DEFAULT_DB_ALIAS).bulk_create(batch)
+            count += len(batch)
+
+        return count
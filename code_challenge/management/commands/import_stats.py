@@ -0,0 +1,69 @@
+import argparse
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from code_challenge.importer.loader import build_courses, get_course_dirs
+from code_challenge.importer.parsers import read_stats
+
+
+def get_rss() -> int | None:
+    """
+    Resident set size of the current process in KiB (Linux only).
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Parse COURSE_ROOT, ignoring any snapshot, and report the wall time, "
+        "files read, bytes read and memory held."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.COURSE_IMPORT_WORKERS,
+            help="Threads to read courses with (defaults to COURSE_IMPORT_WORKERS).",
+        )
+        parser.add_argument(
+            "--lazy",
+            action=argparse.BooleanOptionalAction,
+            default=settings.COURSE_LAZY_FILES,
+            help="Only read meta.json (defaults to COURSE_LAZY_FILES).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Import this many times; later runs read from the page cache.",
+        )
+
+    def handle(self, *args, **options):
+        for run in range(options["repeat"]):
+            read_stats.reset()
+            rss = get_rss()
+            start = time.perf_counter()
+            courses = build_courses(
+                get_course_dirs(settings.COURSE_ROOT),
+                options["workers"],
+                options["lazy"],
+            )
+            elapsed = time.perf_counter() - start
+
+            units = [unit for course in courses for unit in course.get_units()]
+            lessons = sum(unit.number_of_lessons for unit in units)
+            self.stdout.write(
+                f"run {run + 1}: {len(courses)} courses, {len(units)} units, "
+                f"{lessons} lessons; {read_stats.files} files, "
+                f"{read_stats.bytes / 1024:.1f} KiB read in {elapsed * 1000:.1f} ms "
+                f"with {options['workers']} workers"
+                + (f", {get_rss() - rss} KiB RSS added" if rss else "")
+            )
+            del courses, units
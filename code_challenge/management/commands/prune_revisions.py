@@ -0,0 +1,36 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from code_challenge.revisions import prune_revisions
+
+
+class Command(BaseCommand):
+    help = "Delete challenge revisions beyond the retention limit."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=settings.CHALLENGE_REVISIONS_KEEP,
+            help="Revisions to keep per challenge (defaults to the "
+            "CHALLENGE_REVISIONS_KEEP setting). The latest completion snapshot "
+            "is always kept.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Challenges to prune per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["keep"] < 1:
+            raise CommandError("--keep must be at least 1.")
+
+        start = time.perf_counter()
+        deleted = prune_revisions(options["keep"], options["batch_size"])
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} revisions in {elapsed:.2f}s")
+        )
@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('code_challenge', '0002_courses_enrollments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_slug', models.CharField(max_length=250)),
+                ('unit_slug', models.CharField(max_length=250)),
+                ('layout', models.CharField(max_length=16)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('completed_lessons', models.BinaryField(default=b'')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'unit_progress',
+                'constraints': [models.UniqueConstraint(fields=('user', 'course_slug', 'unit_slug'), name='unique_user_unit_progress')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-18 08:55
+
+import code_challenge.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('code_challenge', '0003_unit_progress'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='challenge',
+            name='code',
+            field=code_challenge.models.CodeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,79 @@
+import base64
+import zlib
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# The stored code formats as of this migration, frozen here so that it does
+# not change with code_challenge.models or the current settings.
+CODE_MARKER = "\x02"
+CODE_PLAIN = CODE_MARKER + "p"
+CODE_ZLIB = CODE_MARKER + "z"
+CODE_ZSTD = CODE_MARKER + "s"
+COMPRESS_THRESHOLD = 512
+
+
+def encode_code(code: str) -> str:
+    data = code.encode()
+    if len(data) >= COMPRESS_THRESHOLD:
+        encoded = CODE_ZLIB + base64.b64encode(zlib.compress(data)).decode("ascii")
+        if len(encoded) < len(code):
+            return encoded
+    return code
+
+
+def decode_code(value: str) -> str:
+    if value.startswith(CODE_ZLIB):
+        return zlib.decompress(base64.b64decode(value[len(CODE_ZLIB) :])).decode()
+    if value.startswith(CODE_ZSTD):
+        import zstandard
+
+        data = base64.b64decode(value[len(CODE_ZSTD) :])
+        return zstandard.decompress(data).decode()
+    if value.startswith(CODE_PLAIN):
+        return value[len(CODE_PLAIN) :]
+
+    raise ValueError("Cannot decode code format %r" % value[:2])
+
+
+def update_code(schema_editor, condition: str, params: list, convert):
+    last_id = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT id, code FROM challenges WHERE id > %s AND "
+                + condition
+                + " ORDER BY id LIMIT %s",
+                [last_id, *params, BATCH_SIZE],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            changed = []
+            for id, code in rows:
+                converted = convert(code)
+                if converted != code:
+                    changed.append((converted, id))
+            cursor.executemany("UPDATE challenges SET code = %s WHERE id = %s", changed)
+
+
+def compress_code(apps, schema_editor):
+    condition = "code IS NOT NULL AND code NOT LIKE %s"
+    update_code(schema_editor, condition, [CODE_MARKER + "%"], encode_code)
+
+
+def decompress_code(apps, schema_editor):
+    update_code(schema_editor, "code LIKE %s", [CODE_MARKER + "%"], decode_code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("code_challenge", "0004_challenge_code_field"),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_code, decompress_code),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('code_challenge', '0005_compress_challenge_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StarterCode',
+            fields=[
+                ('digest', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('code', models.TextField()),
+            ],
+            options={
+                'db_table': 'starter_code',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-18 09:00
+
+import code_challenge.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('code_challenge', '0006_starter_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChallengeRevision',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('code', code_challenge.models.CodeField()),
+                ('digest', models.CharField(max_length=32)),
+                ('completed', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('challenge', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='code_challenge.challenge')),
+            ],
+            options={
+                'db_table': 'challenge_revisions',
+                'indexes': [models.Index(fields=['challenge', 'id'], name='idx_challenge_revision')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('code_challenge', '0007_challenge_revisions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='challenge',
+            name='idx_user',
+        ),
+        migrations.RemoveIndex(
+            model_name='challenge',
+            name='idx_user_course',
+        ),
+        migrations.RemoveIndex(
+            model_name='challenge',
+            name='idx_user_unit',
+        ),
+        migrations.RemoveIndex(
+            model_name='challenge',
+            name='idx_user_challenge',
+        ),
+        migrations.AlterField(
+            model_name='challenge',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='challenges', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,34 +1,241 @@
+import base64
+import hashlib
+import json
+import zlib
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models, transaction
 from django.utils import timezone
+from .delta import apply_delta, make_delta
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Stored code that starts with CODE_MARKER is encoded; the character after it
+# names the format. Anything else is plain text, as all older rows are.
+CODE_MARKER = "\x02"
+CODE_PLAIN = CODE_MARKER + "p"
+CODE_ZLIB = CODE_MARKER + "z"
+CODE_ZSTD = CODE_MARKER + "s"
+CODE_DELTA = CODE_MARKER + "d"
+
+# Starter code by digest, for the bases delta-encoded code refers to. Backed
+# by the StarterCode table, which keeps every base ever used.
+_starter_codes = {}
+_archived_digests = set()
+
+
+def compress_code(data: bytes) -> str:
+    if settings.CHALLENGE_CODE_COMPRESSION == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured("zstd compression requires zstandard")
+        return CODE_ZSTD + base64.b64encode(zstandard.compress(data)).decode("ascii")
+
+    if settings.CHALLENGE_CODE_COMPRESSION == "zlib":
+        return CODE_ZLIB + base64.b64encode(zlib.compress(data)).decode("ascii")
+
+    raise ImproperlyConfigured(
+        "Unknown CHALLENGE_CODE_COMPRESSION %s" % settings.CHALLENGE_CODE_COMPRESSION
+    )
+
+
+def encode_code(code: str | None) -> str | None:
+    if code is None:
+        return None
+
+    data = code.encode()
+    if len(data) >= settings.CHALLENGE_COMPRESS_THRESHOLD:
+        encoded = compress_code(data)
+        if len(encoded) < len(code):
+            return encoded
+
+    if code.startswith(CODE_MARKER):
+        return CODE_PLAIN + code
+    return code
+
+
+def decode_code(value: str | None, using: str | None = None) -> str | None:
+    if value is None or not value.startswith(CODE_MARKER):
+        return value
+
+    if value.startswith(CODE_ZLIB):
+        return zlib.decompress(base64.b64decode(value[len(CODE_ZLIB) :])).decode()
+    if value.startswith(CODE_ZSTD):
+        if zstandard is None:
+            raise ImproperlyConfigured("zstd compressed code requires zstandard")
+        data = base64.b64decode(value[len(CODE_ZSTD) :])
+        return zstandard.decompress(data).decode()
+    if value.startswith(CODE_DELTA):
+        digest, _, delta = value[len(CODE_DELTA) :].partition(":")
+        return apply_delta(load_starter_code(digest, using), json.loads(delta))
+    if value.startswith(CODE_PLAIN):
+        return value[len(CODE_PLAIN) :]
+
+    raise ValueError("Unknown code format %r" % value[:2])
+
+
+def encode_delta(code: str, base: str) -> str:
+    """
+    Store code as a delta against its lesson's starter code when that is
+    smaller than storing it whole.
+    """
+    encoded = encode_code(code)
+    digest = get_code_digest(base)
+    delta = json.dumps(make_delta(base, code), separators=(",", ":"))
+    delta = f"{CODE_DELTA}{digest}:{delta}"
+    if len(delta) >= len(encoded):
+        return encoded
+
+    archive_starter_code(digest, base)
+    return delta
+
+
+def get_code_digest(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()[:32]
+
+
+def archive_starter_code(digest: str, base: str):
+    if digest in _archived_digests:
+        return
+
+    StarterCode.objects.bulk_create(
+        [StarterCode(digest=digest, code=base)], ignore_conflicts=True
+    )
+    _starter_codes[digest] = base
+    transaction.on_commit(lambda: _archived_digests.add(digest))
+
+
+def load_starter_code(digest: str, using: str | None = None) -> str:
+    base = _starter_codes.get(digest)
+    if base is None:
+        base = StarterCode.objects.using(using).get(digest=digest).code
+        _starter_codes[digest] = base
+    return base
+
+
+class StoredCode(str):
+    """
+    Code CodeField.pre_save already encoded for storage.
+    """
+
+
+class CodeField(models.TextField):
+    """
+    Text field for saved code. Code of at least CHALLENGE_COMPRESS_THRESHOLD
+    bytes is stored compressed with CHALLENGE_CODE_COMPRESSION when that is
+    smaller. Rows in any known format, including plain text, read back as
+    the original code.
+
+    With CHALLENGE_CODE_DELTA set, code saved on an instance that carries
+    the lesson's starter code in `base_code` may instead be stored as a delta
+    against it.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        return decode_code(value, connection.alias)
+
+    def pre_save(self, model_instance, add):
+        code = super().pre_save(model_instance, add)
+        base = getattr(model_instance, "base_code", None)
+        if code is None or base is None or not settings.CHALLENGE_CODE_DELTA:
+            return code
+        return StoredCode(encode_delta(code, base))
+
+    def get_prep_value(self, value):
+        if isinstance(value, StoredCode):
+            return str(value)
+        return encode_code(super().get_prep_value(value))
+
+
+class ChallengeQuerySet(models.QuerySet):
+    unique_fields = ["user", "course_slug", "unit_slug", "lesson_slug"]
+    insert_fields = [*unique_fields, "code", "completed", "last_attempt"]
+
+    def upsert(self, challenges, update_fields) -> set[tuple[int, str]]:
+        """
+        Insert challenges, or update `update_fields` on the rows that already
+        exist for the same user and lesson, in one INSERT ... ON CONFLICT DO
+        UPDATE statement.
+
+        An existing row is only updated if its last_attempt is not newer than
+        the challenge's, so a write that arrives late, such as a save buffered
+        in another worker, cannot undo a newer one. Returns the (user id,
+        lesson id) of every challenge written.
+        """
+        self._for_write = True
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        fields = [opts.get_field(name) for name in self.insert_fields]
+        table = quote_name(opts.db_table)
+        columns = [quote_name(field.column) for field in fields]
+        unique = ", ".join(columns[: len(self.unique_fields)])
+        updates = ", ".join(
+            "{0} = EXCLUDED.{0}".format(quote_name(opts.get_field(name).column))
+            for name in update_fields
+        )
+        last_attempt = quote_name(opts.get_field("last_attempt").column)
+        returning = connection.features.can_return_rows_from_bulk_insert
+        row = "(%s)" % ", ".join(["%s"] * len(fields))
+
+        written = set()
+        batch_size = connection.ops.bulk_batch_size(fields, challenges) or 1
+        with connection.cursor() as cursor:
+            for start in range(0, len(challenges), batch_size):
+                batch = challenges[start : start + batch_size]
+                sql = (
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES {', '.join([row] * len(batch))} "
+                    f"ON CONFLICT ({unique}) DO UPDATE SET {updates} "
+                    f"WHERE {table}.{last_attempt} <= EXCLUDED.{last_attempt}"
+                )
+                if returning:
+                    sql += f" RETURNING {unique}"
+                params = [
+                    field.get_db_prep_save(field.pre_save(challenge, True), connection)
+                    for challenge in batch
+                    for field in fields
+                ]
+                cursor.execute(sql, params)
+
+                if returning:
+                    written.update(
+                        (user_id, "/".join(slugs))
+                        for user_id, *slugs in cursor.fetchall()
+                    )
+                else:
+                    written.update(
+                        (challenge.user_id, challenge.lesson_id) for challenge in batch
+                    )
+
+        return written
 
 
 class Challenge(models.Model):
     id = models.AutoField(primary_key=True)
+    # Lookups by user use the unique constraint, which leads with it.
     user = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="challenges"
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="challenges",
+        db_index=False,
     )
     course_slug = models.CharField(max_length=250)
     unit_slug = models.CharField(max_length=250)
     lesson_slug = models.CharField(max_length=250)
-    code = models.TextField(null=True, blank=True)
+    code = CodeField(null=True, blank=True)
     completed = models.BooleanField(default=False)  # type: ignore
     last_attempt = models.DateTimeField(default=timezone.now)
 
+    objects = ChallengeQuerySet.as_manager()
+
+    # Starter code of the lesson, for delta storage of code.
+    base_code = None
+
     class Meta:
         db_table = "challenges"
-
-        indexes = [
-            models.Index(fields=["user"], name="idx_user"),
-            models.Index(fields=["user", "course_slug"], name="idx_user_course"),
-            models.Index(
-                fields=["user", "course_slug", "unit_slug"], name="idx_user_unit"
-            ),
-            models.Index(
-                fields=["user", "course_slug", "unit_slug", "lesson_slug"],
-                name="idx_user_challenge",
-            ),
-        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["user", "course_slug", "unit_slug", "lesson_slug"],
@@ -43,6 +250,92 @@ class Challenge(models.Model):
     def lesson_id(self):
         return f"{self.course_slug}/{self.unit_slug}/{self.lesson_slug}"
 
+    @classmethod
+    def from_lesson_id(
+        cls, user_id: int, lesson_id: str, base_code: str | None = None, **fields
+    ):
+        course_slug, unit_slug, lesson_slug = lesson_id.split("/")
+        challenge = cls(
+            user_id=user_id,
+            course_slug=course_slug,
+            unit_slug=unit_slug,
+            lesson_slug=lesson_slug,
+            **fields,
+        )
+        challenge.base_code = base_code
+        return challenge
+
+
+class UnitProgress(models.Model):
+    """
+    Denormalized completion state for one user and unit. Bit n of
+    completed_lessons is set when the lesson with ordinal n is completed;
+    layout records the lesson order the ordinals refer to.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="progress"
+    )
+    course_slug = models.CharField(max_length=250)
+    unit_slug = models.CharField(max_length=250)
+    layout = models.CharField(max_length=16)
+    completed_count = models.PositiveIntegerField(default=0)
+    completed_lessons = models.BinaryField(default=b"")
+
+    class Meta:
+        db_table = "unit_progress"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "course_slug", "unit_slug"],
+                name="unique_user_unit_progress",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.course_slug}/{self.unit_slug}"
+
+
+class ChallengeRevision(models.Model):
+    """
+    Append-only history of the code saved for a challenge. Consecutive
+    identical snapshots are stored once; see revisions.py.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    # Covered by idx_challenge_revision.
+    challenge = models.ForeignKey(
+        Challenge, on_delete=models.CASCADE, related_name="revisions", db_index=False
+    )
+    code = CodeField()
+    digest = models.CharField(max_length=32)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "challenge_revisions"
+        indexes = [
+            models.Index(fields=["challenge", "id"], name="idx_challenge_revision"),
+        ]
+
+    def __str__(self):
+        return f"{self.challenge} @ {self.created_at}"
+
+
+class StarterCode(models.Model):
+    """
+    Every lesson starter code that saved code was delta-encoded against.
+    Rows are never changed, so deltas stay readable after a lesson changes.
+    """
+
+    digest = models.CharField(primary_key=True, max_length=32)
+    code = models.TextField()
+
+    class Meta:
+        db_table = "starter_code"
+
+    def __str__(self):
+        return self.digest
+
 
 class Courses(models.Model):
     # id should be course slug
@@ -0,0 +1,52 @@
+from django.urls import reverse
+
+
+def get_course_outline(course):
+    """
+    The units of a course with each lesson paired with its link:
+    ((unit, ((lesson, link), ...)), ...)
+
+    The same for every user, so it is built once and kept on the course,
+    which a reload replaces along with it.
+    """
+    if course.outline is None:
+        course.outline = tuple(
+            (
+                unit,
+                tuple(
+                    (lesson, reverse("lesson_view", args=lesson.id.split("/")))
+                    for lesson in unit.get_lessons()
+                ),
+            )
+            for unit in course.get_units()
+        )
+
+    return course.outline
+
+
+def get_navigation(lesson):
+    """
+    Parent, next and previous links for a lesson. Lessons at either end of a
+    unit link back to the course. Only built as part of the cached lesson
+    context (see lesson_context.py).
+    """
+    course = lesson.parent.parent
+    course_link = {
+        "link": reverse("course_view", args=[course.slug]),
+        "title": course.title,
+    }
+    return {
+        "parent": course_link,
+        "next_lesson": get_lesson_link(lesson.next) or course_link,
+        "previous_lesson": get_lesson_link(lesson.previous) or course_link,
+    }
+
+
+def get_lesson_link(lesson):
+    if not lesson:
+        return None
+
+    return {
+        "link": reverse("lesson_view", args=lesson.id.split("/")),
+        "title": lesson.title,
+    }
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.template.loader import get_template
+from django.urls import reverse
+from .importer.build_courses import courses
+from .instructions import render_markdown
+from .lesson_context import get_lesson_context
+from .navigation import get_course_outline
+
+TEMPLATES = [
+    "code_challenge/course_view.html",
+    "code_challenge/courses.html",
+    "code_challenge/editor.html",
+    "code_challenge/html_editor.html",
+    "code_challenge/playground_editor.html",
+    "code_challenge/terminal.html",
+]
+
+
+def warm_up():
+    """
+    Do the one-time lazy initialization a first request would otherwise do,
+    so that when it runs in the gunicorn master before fork the resulting
+    objects are shared copy-on-write by every worker.
+    """
+    reverse("courses")
+
+    for name in TEMPLATES:
+        get_template(name)
+
+    # Pygments imports lexers on first use.
+    for language in ["python", "javascript", "html", "css", "bash"]:
+        render_markdown(f"```{language}\n\n```")
+
+    for course in courses.values():
+        get_course_outline(course)
+        # Lazy lessons load their files on first request instead.
+        if settings.COURSE_LAZY_FILES:
+            continue
+        for unit in course.get_units():
+            for lesson in unit.get_lessons():
+                get_lesson_context(lesson)
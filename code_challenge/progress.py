@@ -0,0 +1,221 @@
+import uuid
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .importer.parsers import Course, Lesson, Unit
+from .models import Challenge, UnitProgress
+
+
+def to_bits(data) -> int:
+    return int.from_bytes(bytes(data), "little")
+
+
+def from_bits(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def rebuild_progress(user_id: int, course: Course, units: list[Unit]):
+    """
+    Recompute the progress of `units` from Challenge rows and store it.
+    Returns the completed-lesson bitsets by unit slug.
+    """
+    progress = {unit.slug: 0 for unit in units}
+
+    completed = Challenge.objects.filter(
+        user_id=user_id,
+        course_slug=course.slug,
+        unit_slug__in=progress.keys(),
+        completed=True,
+    ).values_list("unit_slug", "lesson_slug")
+
+    for unit_slug, lesson_slug in completed:
+        lesson = course.get_lesson(unit_slug, lesson_slug)
+        if lesson:
+            progress[unit_slug] |= 1 << lesson.ordinal
+
+    UnitProgress.objects.bulk_create(
+        [
+            UnitProgress(
+                user_id=user_id,
+                course_slug=course.slug,
+                unit_slug=unit.slug,
+                layout=unit.layout,
+                completed_count=progress[unit.slug].bit_count(),
+                completed_lessons=from_bits(progress[unit.slug]),
+            )
+            for unit in units
+        ],
+        update_conflicts=True,
+        unique_fields=["user", "course_slug", "unit_slug"],
+        update_fields=["layout", "completed_count", "completed_lessons"],
+    )
+
+    return progress
+
+
+def get_course_progress(user_id: int, course: Course) -> dict[str, int]:
+    """
+    Completed-lesson bitsets for every unit in the course, by unit slug.
+    Units without a stored record, or whose lessons were reordered since it
+    was stored, are rebuilt from Challenge rows.
+    """
+    rows = {
+        row.unit_slug: row
+        for row in UnitProgress.objects.filter(user_id=user_id, course_slug=course.slug)
+    }
+
+    progress = {}
+    stale = []
+
+    for unit in course.get_units():
+        row = rows.get(unit.slug)
+        if row is None or row.layout != unit.layout:
+            stale.append(unit)
+        else:
+            progress[unit.slug] = to_bits(row.completed_lessons)
+
+    if stale:
+        progress.update(rebuild_progress(user_id, course, stale))
+
+    return progress
+
+
+def record_completion(user_id: int, changes: dict[Lesson, bool]):
+    """
+    Set or clear the completed bit of each lesson in `changes`. Must run after
+    the matching Challenge rows are written, since a missing or stale unit
+    record is rebuilt from them.
+    """
+    by_unit = defaultdict(dict)
+    for lesson, completed in changes.items():
+        by_unit[lesson.parent][lesson.ordinal] = completed
+
+    with transaction.atomic():
+        for unit, ordinals in by_unit.items():
+            row = (
+                UnitProgress.objects.select_for_update()
+                .filter(
+                    user_id=user_id,
+                    course_slug=unit.parent.slug,
+                    unit_slug=unit.slug,
+                )
+                .first()
+            )
+
+            if row is None or row.layout != unit.layout:
+                rebuild_progress(user_id, unit.parent, [unit])
+                continue
+
+            bits = to_bits(row.completed_lessons)
+            for ordinal, completed in ordinals.items():
+                if completed:
+                    bits |= 1 << ordinal
+                else:
+                    bits &= ~(1 << ordinal)
+
+            row.completed_count = bits.bit_count()
+            row.completed_lessons = from_bits(bits)
+            row.save(update_fields=["completed_count", "completed_lessons"])
+
+
+def get_cache_key(user_id: int, course_slug: str) -> str:
+    return "progress:%s:%s" % (user_id, course_slug)
+
+
+def new_cache_version() -> str:
+    return uuid.uuid4().hex
+
+
+def get_cache_version(cache, key: str) -> str:
+    """
+    The current version of a progress entry. Writes replace it with a new
+    random one rather than edit the entry, so an entry loaded before a write
+    committed is never read afterwards. Unlike an incremented counter, this
+    needs no atomic increment: two workers writing at once each store a
+    version that no entry has been stored under yet.
+    """
+    version_key = f"{key}:version"
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, new_cache_version(), None)
+        version = cache.get(version_key)
+    return version
+
+
+async def aget_cache_version(cache, key: str) -> str:
+    version_key = f"{key}:version"
+    version = await cache.aget(version_key)
+    if version is None:
+        await cache.aadd(version_key, new_cache_version(), None)
+        version = await cache.aget(version_key)
+    return version
+
+
+def load_user_progress(user_id: int, course: Course) -> dict:
+    progress = get_course_progress(user_id, course)
+    completed = {
+        lesson.id
+        for unit in course.get_units()
+        for lesson in unit.get_lessons()
+        if progress.get(unit.slug, 0) >> lesson.ordinal & 1
+    }
+
+    # Only which lessons have code; the code itself is read when a lesson is.
+    saved = Challenge.objects.filter(
+        user_id=user_id, course_slug=course.slug, code__isnull=False
+    ).values_list("unit_slug", "lesson_slug")
+
+    return {
+        "completed": completed,
+        "saved": {
+            f"{course.slug}/{unit_slug}/{lesson_slug}"
+            for unit_slug, lesson_slug in saved
+        },
+    }
+
+
+def get_user_progress(user_id: int, course: Course) -> dict:
+    """
+    The lesson ids a user completed in a course and the lesson ids they
+    saved code for, from the progress cache or, on a miss, from the
+    database.
+    """
+    cache = caches[settings.PROGRESS_CACHE]
+    key = get_cache_key(user_id, course.slug)
+    version = get_cache_version(cache, key)
+    progress = cache.get(key, version=version)
+
+    if progress is None:
+        progress = load_user_progress(user_id, course)
+        cache.set(key, progress, settings.PROGRESS_CACHE_TIMEOUT, version=version)
+
+    return progress
+
+
+async def aget_user_progress(user_id: int, course: Course) -> dict:
+    cache = caches[settings.PROGRESS_CACHE]
+    key = get_cache_key(user_id, course.slug)
+    version = await aget_cache_version(cache, key)
+    progress = await cache.aget(key, version=version)
+
+    if progress is None:
+        # A miss may rebuild unit progress, which needs a transaction.
+        progress = await sync_to_async(load_user_progress)(user_id, course)
+        await cache.aset(
+            key, progress, settings.PROGRESS_CACHE_TIMEOUT, version=version
+        )
+
+    return progress
+
+
+def invalidate_user_progress(user_id: int, lesson_ids):
+    """
+    Drop the cached progress of the courses of `lesson_ids`, once the writes
+    to them are committed.
+    """
+    cache = caches[settings.PROGRESS_CACHE]
+    for course_slug in {lesson_id.split("/")[0] for lesson_id in lesson_ids}:
+        key = get_cache_key(user_id, course_slug)
+        cache.set(f"{key}:version", new_cache_version(), None)
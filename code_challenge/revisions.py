@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from .models import Challenge, ChallengeRevision, get_code_digest
+
+# Appends a revision for the challenge of one user and lesson unless its
+# latest revision already has the same code (and, for a completion
+# snapshot, is one). A single statement, so it adds one indexed insert to
+# the write path and no read.
+RECORD_REVISION_SQL = """
+INSERT INTO {revisions} (challenge_id, code, digest, completed, created_at)
+SELECT c.id, %s, %s, %s, %s FROM {challenges} c
+WHERE c.user_id = %s AND c.course_slug = %s AND c.unit_slug = %s
+AND c.lesson_slug = %s
+AND NOT EXISTS (
+    SELECT 1 FROM {revisions} r
+    WHERE r.id = (
+        SELECT MAX(latest.id) FROM {revisions} latest
+        WHERE latest.challenge_id = c.id
+    )
+    AND r.digest = %s AND (r.completed OR NOT %s)
+)
+""".format(
+    revisions=ChallengeRevision._meta.db_table,
+    challenges=Challenge._meta.db_table,
+)
+
+
+def record_revisions(user_id: int, snapshots: dict[str, tuple[str, bool]]):
+    """
+    Append a revision for each lesson id in `snapshots`, a mapping to the
+    saved code and whether it completed the challenge. Must run after the
+    Challenge rows are written.
+    """
+    if not settings.CHALLENGE_REVISIONS_KEEP:
+        return
+
+    code_field = ChallengeRevision._meta.get_field("code")
+    created_at = ChallengeRevision._meta.get_field("created_at").get_db_prep_value(
+        timezone.now(), connection
+    )
+
+    params = []
+    for lesson_id, (code, completed) in snapshots.items():
+        if code is None:
+            continue
+        digest = get_code_digest(code)
+        params.append(
+            [
+                code_field.get_db_prep_value(code, connection),
+                digest,
+                completed,
+                created_at,
+                user_id,
+                *lesson_id.split("/"),
+                digest,
+                completed,
+            ]
+        )
+
+    if params:
+        with connection.cursor() as cursor:
+            cursor.executemany(RECORD_REVISION_SQL, params)
+
+
+def prune_revisions(keep: int, batch_size: int) -> int:
+    """
+    Delete all but the `keep` latest revisions of each challenge, keeping
+    its latest completion snapshot too. Works through the challenges with
+    too many revisions `batch_size` at a time. Returns the number deleted.
+    """
+    over_limit = (
+        ChallengeRevision.objects.values("challenge_id")
+        .annotate(count=Count("id"))
+        .filter(count__gt=keep)
+        .order_by("challenge_id")
+        .values_list("challenge_id", flat=True)
+    )
+
+    deleted = 0
+    last_id = 0
+    while batch := list(over_limit.filter(challenge_id__gt=last_id)[:batch_size]):
+        last_id = batch[-1]
+        completions = dict(
+            ChallengeRevision.objects.filter(challenge_id__in=batch, completed=True)
+            .values("challenge_id")
+            .annotate(latest=Max("id"))
+            .values_list("challenge_id", "latest")
+        )
+
+        with transaction.atomic():
+            for challenge_id in batch:
+                revisions = ChallengeRevision.objects.filter(challenge_id=challenge_id)
+                newest = revisions.order_by("-id").values_list("id", flat=True)
+                cutoff = newest[keep - 1]
+                count, _ = (
+                    revisions.filter(id__lt=cutoff)
+                    .exclude(id=completions.get(challenge_id))
+                    .delete()
+                )
+                deleted += count
+
+    return deleted
@@ -0,0 +1,215 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import (
+    IntegrityError,
+    InterfaceError,
+    OperationalError,
+    close_old_connections,
+    transaction,
+)
+from django.utils import timezone
+from .importer.build_courses import courses
+from .models import Challenge
+from .progress import invalidate_user_progress
+from .revisions import record_revisions
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def get_base_code(lesson_id: str) -> str | None:
+    """
+    The starter code to delta-encode code saved for a lesson against. Only
+    looked up with CHALLENGE_CODE_DELTA set, as it may read lesson files.
+    """
+    if not settings.CHALLENGE_CODE_DELTA:
+        return None
+    return courses.get_starter_code(lesson_id)
+
+
+class SaveBuffer:
+    """
+    Write-behind buffer for saved code. Saves of the same (user, lesson) made
+    within one window coalesce into a single row, and a background thread
+    writes all pending rows as one batched upsert every `window` seconds.
+
+    Each save keeps the time it was made, and the upsert skips rows written
+    after that, so a flush never undoes a reset, completion or newer save
+    handled by another worker in the meantime. Until the flush, only this
+    worker sees the save; page loads served by other workers show the code
+    saved before it for up to one window.
+
+    At most one window of saves can be lost if a worker dies without running
+    its exit hooks; a graceful shutdown flushes whatever is pending. Saves
+    that fail on a transient database error are retried by the next flush,
+    up to max_pending of them; one that can never be written (say, of a
+    deleted user) is logged and dropped without holding back the others.
+    """
+
+    def __init__(self, window: float, max_pending: int):
+        self.window = window
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+
+    def add(self, user_id: int, lesson_id: str, code: str | None):
+        if self._put(user_id, lesson_id, code):
+            self.flush()
+
+    async def aadd(self, user_id: int, lesson_id: str, code: str | None):
+        # Only a save that has to flush leaves the event loop.
+        if self._put(user_id, lesson_id, code):
+            await sync_to_async(self.flush)()
+
+    def _put(self, user_id: int, lesson_id: str, code: str | None) -> bool:
+        """
+        Queue a save; returns whether the caller should flush now.
+        """
+        with self._lock:
+            self._pending[(user_id, lesson_id)] = (code, timezone.now())
+            full = len(self._pending) >= self.max_pending
+
+        if self.window <= 0 or full:
+            return True
+
+        self._start()
+        return False
+
+    def get(self, user_id: int, lesson_id: str):
+        """
+        Return the pending code for a lesson, or MISSING if nothing is pending.
+        """
+        with self._lock:
+            pending = self._pending.get((user_id, lesson_id))
+        return MISSING if pending is None else pending[0]
+
+    def discard(self, user_id: int, lesson_id: str):
+        """
+        Drop a pending save that a newer write is about to supersede. Waits
+        for an in-flight flush so it cannot land after the newer write.
+        """
+        with self._flush_lock, self._lock:
+            self._pending.pop((user_id, lesson_id), None)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            if not pending:
+                return
+
+            try:
+                written = self._write(pending)
+            except IntegrityError:
+                # One row that can never be written, e.g. of a deleted user,
+                # must not hold back the others.
+                written = set()
+                for key, value in pending.items():
+                    written |= self._write_one(key, value)
+            except (OperationalError, InterfaceError):
+                logger.exception("Failed to flush %d saved challenges", len(pending))
+                self._requeue(pending)
+                return
+            except Exception:
+                logger.exception("Dropped %d saved challenges", len(pending))
+                return
+
+            lessons = defaultdict(list)
+            for user_id, lesson_id in written:
+                lessons[user_id].append(lesson_id)
+            try:
+                for user_id, lesson_ids in lessons.items():
+                    invalidate_user_progress(user_id, lesson_ids)
+            except Exception:
+                logger.exception("Failed to invalidate cached progress")
+
+    def _write(self, pending: dict) -> set[tuple[int, str]]:
+        """
+        Upsert pending saves and record their revisions in one transaction.
+        Returns the (user id, lesson id) pairs written; rows reset, completed
+        or saved elsewhere since are kept.
+        """
+        challenges = [
+            Challenge.from_lesson_id(
+                user_id,
+                lesson_id,
+                base_code=get_base_code(lesson_id),
+                code=code,
+                last_attempt=last_attempt,
+            )
+            for (user_id, lesson_id), (code, last_attempt) in pending.items()
+        ]
+
+        with transaction.atomic():
+            written = Challenge.objects.upsert(challenges, ["code", "last_attempt"])
+            saved = defaultdict(dict)
+            for user_id, lesson_id in written:
+                saved[user_id][lesson_id] = (pending[(user_id, lesson_id)][0], False)
+            for user_id, revisions in saved.items():
+                record_revisions(user_id, revisions)
+
+        return written
+
+    def _write_one(self, key: tuple[int, str], value) -> set[tuple[int, str]]:
+        user_id, lesson_id = key
+        try:
+            return self._write({key: value})
+        except (OperationalError, InterfaceError):
+            logger.exception("Failed to flush saved %s of user %s", lesson_id, user_id)
+            self._requeue({key: value})
+        except Exception:
+            logger.exception("Dropped saved %s of user %s", lesson_id, user_id)
+        return set()
+
+    def _requeue(self, pending: dict):
+        """
+        Put back saves that failed on a transient error, keeping anything
+        saved again since and at most max_pending saves, newest first.
+        """
+        with self._lock:
+            for key, value in pending.items():
+                self._pending.setdefault(key, value)
+
+            dropped = len(self._pending) - self.max_pending
+            if dropped > 0:
+                newest = sorted(
+                    self._pending.items(), key=lambda item: item[1][1], reverse=True
+                )
+                self._pending = dict(newest[: self.max_pending])
+
+        if dropped > 0:
+            logger.error("Dropped %d saved challenges, the buffer is full", dropped)
+
+    def _start(self):
+        # Threads do not survive fork, so each worker process starts its own.
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+
+        threading.Thread(target=self._run, name="save-buffer", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            self.flush()
+            close_old_connections()
+
+
+save_buffer = SaveBuffer(
+    settings.SAVE_BUFFER_WINDOW, settings.SAVE_BUFFER_MAX_PENDING
+)
+atexit.register(save_buffer.flush)
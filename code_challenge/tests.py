@@ -1,3 +1,1281 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from io import StringIO
+from unittest import mock
+import brotli
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import (
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from app.urls import get_hashed_static_names
+from . import api, models, views
+from .importer.build_courses import build_course, build_courses, courses, get_courses
+from .importer.parsers import Lesson, lesson_files, read_stats
+from .importer.registry import CourseRegistry
+from .importer.snapshot import read_manifest, read_snapshot
+from .importer.validation import validate_course
+from .importer.watcher import CourseWatcher
+from .instructions import InstructionsCache, instructions_cache
+from .lesson_context import build_lesson_context, get_request_context
+from .navigation import get_course_outline
+from .models import (
+    CODE_DELTA,
+    CODE_ZLIB,
+    CODE_ZSTD,
+    Challenge,
+    ChallengeRevision,
+    UnitProgress,
+)
+from .progress import (
+    get_cache_key,
+    get_cache_version,
+    get_course_progress,
+    get_user_progress,
+    invalidate_user_progress,
+    load_user_progress,
+)
+from .revisions import prune_revisions
+from .save_buffer import MISSING, SaveBuffer
 
-# Create your tests here.
+
+def setUpModule():
+    # Keep rendered instructions out of the repository's cache directory.
+    directory = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(directory.cleanup)
+    cache_dir = override_settings(INSTRUCTIONS_CACHE_DIR=directory.name)
+    cache_dir.enable()
+    unittest.addModuleCleanup(cache_dir.disable)
+
+
+class InstructionsCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = InstructionsCache(10, directory.name)
+
+    def get_files(self) -> set[str]:
+        return {
+            name
+            for _, _, files in os.walk(self.cache.directory)
+            for name in files
+            if name.endswith(".html")
+        }
+
+    def test_changed_instructions_replace_their_rendering_on_disk(self):
+        self.assertIn("<h1>", self.cache.get("# One", "course/unit/lesson"))
+        self.assertEqual(self.get_files(), {f"{self.cache.get_key('# One')}.html"})
+
+        self.cache.get("# Two", "course/unit/lesson")
+        self.cache.get("# Other", "course/unit/other")
+        self.assertEqual(
+            self.get_files(),
+            {f"{self.cache.get_key(source)}.html" for source in ["# Two", "# Other"]},
+        )
+
+        # Another process, starting with an empty memory tier, reads it back.
+        cache = InstructionsCache(10, self.cache.directory)
+        with mock.patch("code_challenge.instructions.render_markdown") as render:
+            self.assertIn("<h1>", cache.get("# Two", "course/unit/lesson"))
+        render.assert_not_called()
+
+    def test_memory_only_cache(self):
+        cache = InstructionsCache(10)
+        self.assertIn("<h1>", cache.get("# One", "course/unit/lesson"))
+        self.assertEqual(self.get_files(), set())
+
+    def test_cache_dir_follows_settings(self):
+        with override_settings(INSTRUCTIONS_CACHE_DIR=self.cache.directory):
+            self.assertEqual(instructions_cache.directory, self.cache.directory)
+        self.assertEqual(instructions_cache.directory, settings.INSTRUCTIONS_CACHE_DIR)
+
+
+class ChallengeUpsertTests(TestCase):
+    """
+    The single-statement upsert used by the challenge API, checked against
+    the update_or_create write path it replaced.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("student", password="pw")
+
+    def lesson_ids(self):
+        return [
+            f"course/unit-{unit}/lesson-{lesson}"
+            for unit in range(3)
+            for lesson in range(10)
+        ]
+
+    def update_or_create(self, lesson_id: str, code: str):
+        course_slug, unit_slug, lesson_slug = lesson_id.split("/")
+        Challenge.objects.update_or_create(
+            user=self.user,
+            course_slug=course_slug,
+            unit_slug=unit_slug,
+            lesson_slug=lesson_slug,
+            defaults={"completed": True, "code": code},
+        )
+
+    def upsert(self, lesson_id: str, code: str):
+        challenge = Challenge.from_lesson_id(
+            self.user.pk, lesson_id, completed=True, code=code
+        )
+        Challenge.objects.upsert([challenge], ["completed", "code"])
+
+    def write_all(self, write, code: str) -> list:
+        for lesson_id in self.lesson_ids():
+            write(lesson_id, code)
+        return sorted(
+            Challenge.objects.values_list(
+                "unit_slug", "lesson_slug", "code", "completed"
+            )
+        )
+
+    def test_upsert_is_one_statement(self):
+        self.upsert("course/unit/lesson", "a")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.upsert("course/unit/lesson", "b")
+
+        self.assertEqual(len(queries), 1)
+        challenge = Challenge.objects.get(user=self.user)
+        self.assertEqual((challenge.code, challenge.completed), ("b", True))
+
+    def test_upsert_matches_update_or_create(self):
+        inserted = self.write_all(self.update_or_create, "print(1)")
+        updated = self.write_all(self.update_or_create, "print(2)")
+        Challenge.objects.all().delete()
+
+        self.assertEqual(self.write_all(self.upsert, "print(1)"), inserted)
+        self.assertEqual(self.write_all(self.upsert, "print(2)"), updated)
+        self.assertEqual(len(updated), len(self.lesson_ids()))
+
+
+def write_course(root: str) -> str:
+    files = {
+        "meta.json": {"title": "Course", "slug": "course", "version": "1"},
+        "unit/meta.json": {"title": "Unit", "slug": "unit"},
+        "unit/lesson/meta.json": {
+            "title": "Lesson",
+            "slug": "lesson",
+            "language": "html",
+            "type": "editor",
+            "version": "1",
+            "tests": True,
+            "exports": [],
+        },
+        "unit/lesson/instructions.md": "# Lesson\n\n```html\n<p></p>\n```\n",
+        "unit/lesson/source.html": "<p>Hello</p>\n" * 100,
+        "unit/lesson/styles.css": "p { color: red; }\n" * 50,
+        "unit/lesson/script.js": "console.log(1);\n" * 50,
+        "unit/lesson/test.js": "",
+    }
+    course_dir = os.path.join(root, "course")
+    for name, content in files.items():
+        path = os.path.join(course_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            if not isinstance(content, str):
+                content = json.dumps(content)
+            file.write(content)
+    return course_dir
+
+
+def write_lessons(course_dir: str, slugs: list[str]):
+    """
+    Copy the lesson of write_course() to more lessons of the same unit.
+    """
+    for slug in slugs:
+        lesson_dir = shutil.copytree(
+            os.path.join(course_dir, "unit", "lesson"),
+            os.path.join(course_dir, "unit", slug),
+        )
+        meta_path = os.path.join(lesson_dir, "meta.json")
+        with open(meta_path) as file:
+            meta = json.load(file)
+        with open(meta_path, "w") as file:
+            json.dump({**meta, "slug": slug}, file)
+
+
+class CourseImportTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.course_dir = write_course(directory.name)
+        # Several units of several lessons, named so that directory order
+        # differs from creation order.
+        for unit in range(5, 0, -1):
+            for lesson in range(4, -1, -1):
+                lesson_dir = os.path.join(self.course_dir, f"u{unit}", f"l{lesson}")
+                os.makedirs(lesson_dir)
+                with open(os.path.join(lesson_dir, "meta.json"), "w") as file:
+                    json.dump({"slug": f"lesson-{lesson}", "language": "python"}, file)
+            unit_meta = os.path.join(self.course_dir, f"u{unit}", "meta.json")
+            with open(unit_meta, "w") as file:
+                json.dump({"slug": f"unit-{unit}"}, file)
+
+    def describe(self, course):
+        return [
+            (
+                unit.slug,
+                unit.previous and unit.previous.slug,
+                [
+                    (lesson.id, lesson.ordinal, lesson.previous and lesson.previous.id)
+                    for lesson in unit.get_lessons()
+                ],
+            )
+            for unit in course.get_units()
+        ]
+
+    def test_parallel_import_matches_serial(self):
+        (serial,) = build_courses([self.course_dir], workers=1)
+        (parallel,) = build_courses([self.course_dir], workers=4)
+
+        self.assertEqual(self.describe(parallel), self.describe(serial))
+        self.assertEqual(
+            [unit.slug for unit in parallel.get_units()],
+            ["unit-1", "unit-2", "unit-3", "unit-4", "unit-5", "unit"],
+        )
+        for unit in parallel.get_units():
+            self.assertIs(unit.parent, parallel)
+
+    @override_settings(COURSE_LAZY_FILES=True)
+    def test_lazy_lessons_load_files_on_use(self):
+        self.addCleanup(setattr, lesson_files, "max_size", lesson_files.max_size)
+        self.addCleanup(
+            setattr, lesson_files, "check_interval", lesson_files.check_interval
+        )
+        lesson_files.check_interval = 0
+        self.addCleanup(lesson_files.clear)
+        lesson_files.clear()
+        read_stats.reset()
+
+        (course,) = build_courses([self.course_dir])
+        lesson = course.get_lesson("unit", "lesson")
+        self.assertEqual(read_stats.files, 1 + 6 + 26)  # meta.json only
+
+        hits, misses = lesson_files.hits, lesson_files.misses
+        code = lesson.starter_code
+        self.assertIn("<p>Hello</p>", code)
+        self.assertEqual(lesson.starter_code, code)
+        self.assertEqual(lesson_files.hits - hits, 1)
+        self.assertEqual(lesson_files.misses - misses, 1)
+
+        path = os.path.join(lesson.directory, "source.html")
+        with open(path, "w") as file:
+            file.write("<p>Changed</p>")
+        os.utime(path, ns=(0, 0))
+        self.assertIn("<p>Changed</p>", lesson.starter_code)
+
+        lesson_files.max_size = lesson_files.size - 1
+        course.get_lesson("unit-1", "lesson-0").source_file
+        self.assertEqual(lesson_files.get_stats()["entries"], 1)
+
+
+class BuildCoursesCommandTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, "courses")
+        self.course_dir = write_course(self.root)
+        self.output = os.path.join(directory.name, "courses.bin")
+
+    def build(self, *args):
+        stdout = StringIO()
+        with override_settings(COURSE_ROOT=self.root):
+            call_command(
+                "build_courses",
+                "--output",
+                self.output,
+                *args,
+                stdout=stdout,
+                stderr=StringIO(),
+            )
+        return stdout.getvalue()
+
+    def test_workers_parse_courses_changed_since_the_snapshot(self):
+        shutil.copytree(self.course_dir, os.path.join(self.root, "zz"))
+        with open(os.path.join(self.root, "zz", "meta.json"), "w") as file:
+            json.dump({"title": "Other", "slug": "other"}, file)
+        self.build()
+
+        with override_settings(COURSE_ROOT=self.root, COURSE_SNAPSHOT=self.output):
+            read_stats.reset()
+            loaded = get_courses()
+            self.assertEqual(read_stats.files, 0)
+            self.assertEqual(list(loaded), ["course", "other"])
+
+            path = os.path.join(self.course_dir, "unit", "lesson", "source.html")
+            with open(path, "w") as file:
+                file.write("<p>Changed</p>")
+            with self.assertLogs("code_challenge.importer.build_courses", "WARNING"):
+                loaded = get_courses()
+
+        lesson = loaded["course"].get_lesson("unit", "lesson")
+        self.assertIn("<p>Changed</p>", lesson.starter_code)
+        # Only the changed course was parsed.
+        files = read_stats.files
+        read_stats.reset()
+        build_courses([self.course_dir])
+        self.assertEqual(files, read_stats.files)
+
+    def test_validate_course(self):
+        self.assertEqual(validate_course(self.course_dir), [])
+
+        lesson_dir = os.path.join(self.course_dir, "unit", "lesson")
+        with open(os.path.join(lesson_dir, "meta.json"), "w") as file:
+            file.write("{")
+        copy_dir = os.path.join(self.course_dir, "unit", "copy")
+        os.makedirs(copy_dir)
+        with open(os.path.join(copy_dir, "meta.json"), "w") as file:
+            json.dump(
+                {"title": "Copy", "slug": "copy", "language": "html", "type": "quiz"},
+                file,
+            )
+        with open(os.path.join(self.course_dir, "unit", "meta.json"), "w") as file:
+            json.dump({"title": "Unit", "slug": "a unit"}, file)
+
+        errors = validate_course(self.course_dir)
+        self.assertEqual(len(errors), 3, errors)
+        self.assertIn("invalid slug 'a unit'", errors[0])
+        self.assertTrue(errors[1].startswith(copy_dir))
+        self.assertIn("unknown lesson type quiz", errors[1])
+        self.assertTrue(errors[2].startswith(lesson_dir))
+
+        with self.assertRaises(CommandError):
+            self.build()
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_rebuilds_changed_courses_only(self):
+        other_dir = shutil.copytree(self.course_dir, os.path.join(self.root, "zz"))
+        with open(os.path.join(other_dir, "meta.json"), "w") as file:
+            json.dump({"title": "Other", "slug": "other"}, file)
+
+        self.assertIn("(2 rebuilt)", self.build())
+        self.assertIn("(0 rebuilt)", self.build())
+
+        path = os.path.join(self.course_dir, "unit", "lesson", "source.html")
+        with open(path, "a") as file:
+            file.write("<p>Changed</p>")
+        output = self.build()
+        self.assertIn("course: 1 files changed", output)
+        self.assertIn("zz: unchanged", output)
+        self.assertIn("(1 rebuilt)", output)
+
+        snapshot = read_snapshot(self.output)
+        lesson = snapshot["course"][1].get_lesson("unit", "lesson")
+        self.assertIn("<p>Changed</p>", lesson.starter_code)
+        manifest = read_manifest(f"{self.output}.manifest.json")
+        self.assertEqual(manifest["courses"]["zz"]["lessons"], ["other/unit/lesson"])
+
+
+class CourseWatcherTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.course_dir = write_course(self.root)
+        self.other_dir = shutil.copytree(
+            self.course_dir, os.path.join(self.root, "other")
+        )
+        self.write_meta(self.other_dir, "other")
+        self.registry = CourseRegistry(
+            {
+                course.slug: course
+                for course in build_courses([self.course_dir, self.other_dir])
+            }
+        )
+        self.watcher = CourseWatcher(self.registry, self.root, 0)
+        self.watcher._signatures.update(self.watcher.get_changed())
+
+    def write_meta(self, course_dir: str, slug: str):
+        with open(os.path.join(course_dir, "meta.json"), "w") as file:
+            json.dump({"title": slug.title(), "slug": slug}, file)
+
+    def test_unchanged_courses_are_not_reloaded(self):
+        self.assertEqual(self.watcher.get_changed(), {})
+
+    def test_changed_course_is_swapped_in(self):
+        previous = self.registry["course"]
+        path = os.path.join(self.course_dir, "unit", "lesson", "source.html")
+        with open(path, "w") as file:
+            file.write("<p>Changed</p>")
+
+        changed = self.watcher.get_changed()
+        self.assertEqual(list(changed), [self.course_dir])
+        self.watcher.reload(changed)
+
+        self.assertIsNot(self.registry["course"], previous)
+        self.assertIn(
+            "<p>Changed</p>", self.registry.get_starter_code("course/unit/lesson")
+        )
+        self.assertEqual(self.watcher.get_changed(), {})
+
+    def test_slug_change_replaces_the_old_slug(self):
+        self.write_meta(self.course_dir, "renamed")
+        self.watcher.reload(self.watcher.get_changed())
+
+        self.assertEqual(sorted(self.registry), ["other", "renamed"])
+        self.assertIsNone(self.registry.get_lesson("course/unit/lesson"))
+        self.assertIsNotNone(self.registry.get_lesson("renamed/unit/lesson"))
+
+    def test_removed_course_is_unregistered(self):
+        shutil.rmtree(self.other_dir)
+        self.watcher.reload(self.watcher.get_changed())
+
+        self.assertEqual(list(self.registry), ["course"])
+        self.assertIsNone(self.registry.get_lesson("other/unit/lesson"))
+
+    def test_broken_course_keeps_its_last_good_version(self):
+        previous = self.registry["course"]
+        self.write_meta(self.course_dir, "other")
+        with self.assertLogs("code_challenge.importer.watcher", "ERROR"):
+            self.watcher.reload(self.watcher.get_changed())
+
+        self.assertIs(self.registry["course"], previous)
+        self.assertEqual(self.registry["other"].directory, self.other_dir)
+        # Not retried until its files change again.
+        self.assertEqual(self.watcher.get_changed(), {})
+
+        self.write_meta(self.course_dir, "course")
+        self.watcher.reload(self.watcher.get_changed())
+        self.assertIsNot(self.registry["course"], previous)
+
+    def test_file_deleted_during_first_pass_does_not_stop_the_watcher(self):
+        watcher = CourseWatcher(self.registry, self.root, 0)
+        get_signature = watcher.get_signature
+
+        def delete_midway(course_dir):
+            if course_dir == self.other_dir:
+                raise FileNotFoundError(course_dir)
+            return get_signature(course_dir)
+
+        with (
+            mock.patch.object(watcher, "get_signature", delete_midway),
+            mock.patch.object(watcher, "watch"),
+            mock.patch.object(watcher, "poll"),
+        ):
+            watcher.run()
+
+        self.assertEqual(list(watcher._signatures), [self.course_dir])
+        self.assertEqual(list(watcher.get_changed()), [self.other_dir])
+
+
+class CourseRegistryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.course_dir = write_course(directory.name)
+        (self.course,) = build_courses([self.course_dir])
+        self.registry = CourseRegistry({})
+
+    def test_replace_and_remove_update_the_lesson_index(self):
+        self.registry.replace(self.course)
+        self.assertIs(self.registry["course"], self.course)
+        lesson = self.registry.get_lesson("course/unit/lesson")
+        self.assertIs(lesson, self.course.get_lesson("unit", "lesson"))
+
+        (rebuilt,) = build_courses([self.course_dir])
+        self.registry.replace(rebuilt, self.course)
+        self.assertIs(self.registry["course"], rebuilt)
+        self.assertIs(
+            self.registry.get_lesson("course/unit/lesson"),
+            rebuilt.get_lesson("unit", "lesson"),
+        )
+
+        self.registry.remove(rebuilt)
+        self.assertEqual(len(self.registry), 0)
+        self.assertIsNone(self.registry.get_lesson("course/unit/lesson"))
+
+    def test_duplicate_slug_is_refused(self):
+        self.registry.replace(self.course)
+        (copy,) = build_courses([self.course_dir])
+
+        with self.assertRaisesMessage(ValueError, "Duplicate course slug course"):
+            self.registry.replace(copy)
+        self.assertIs(self.registry["course"], self.course)
+
+
+class CourseTreeMemoryBenchmark(SimpleTestCase):
+    """
+    Memory held per lesson by the parsed tree of a 10,000-lesson course,
+    with lesson files loaded lazily so only the tree itself is counted.
+    """
+
+    units = 50
+    lessons_per_unit = 200
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.course_dir = os.path.join(cls.directory.name, "course")
+        files = {"meta.json": {"title": "Course", "slug": "course", "version": "1"}}
+        for unit in range(cls.units):
+            files[f"{unit:03}/meta.json"] = {"title": "Unit", "slug": f"u{unit}"}
+            for lesson in range(cls.lessons_per_unit):
+                files[f"{unit:03}/{lesson:03}/meta.json"] = {
+                    "title": f"Lesson {lesson}",
+                    "slug": f"lesson-{lesson}",
+                    "language": "python",
+                    "type": "editor",
+                    "version": "1",
+                    "tests": True,
+                    "exports": [],
+                }
+        for name, content in files.items():
+            path = os.path.join(cls.course_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as file:
+                json.dump(content, file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_tree_memory(self):
+        tracemalloc.start()
+        try:
+            (course,) = build_courses([self.course_dir], workers=1, lazy=True)
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        count = self.units * self.lessons_per_unit
+
+        lesson = course.get_lesson("u1", "lesson-0")
+        self.assertFalse(hasattr(lesson, "__dict__"))
+        self.assertEqual(lesson.previous, None)
+        self.assertEqual(lesson.next.slug, "lesson-1")
+        self.assertIs(lesson.slug, course.get_lesson("u2", "lesson-0").slug)
+        self.assertLess(size / count, 1024)
+
+
+class LessonContextTests(TestCase):
+    """
+    A lesson page's context: the request state merged into the cached
+    per-lesson context.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.lesson = build_course(write_course(cls.directory.name)).get_lesson(
+            "unit", "lesson"
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def render(self):
+        return get_request_context(self.lesson, False, None, AnonymousUser())
+
+    def test_request_state_is_merged(self):
+        context = self.render()
+        meta = json.loads(context["meta_json"])
+
+        self.assertEqual(meta["lesson_id"], "course/unit/lesson")
+        self.assertEqual(meta["completed"], False)
+        self.assertEqual(meta["user"], {"authenticated": False, "id": None})
+        self.assertEqual(
+            meta["file_system"], json.loads(self.lesson.create_file_system(None))
+        )
+        self.assertEqual(context["challenge"]["completed"], False)
+
+    def test_context_is_built_once(self):
+        cached = self.render()
+        with mock.patch(
+            "code_challenge.lesson_context.build_lesson_context",
+            wraps=build_lesson_context,
+        ) as build:
+            self.render()
+            self.assertEqual(build.call_count, 0)
+            self.lesson.files.context = None
+            self.assertEqual(self.render(), cached)
+            self.assertEqual(build.call_count, 1)
+
+
+def use_private_save_buffer(test) -> SaveBuffer:
+    """
+    Route the challenge API and views through a fresh buffer for one test, so
+    nothing is left pending in the global one for its exit-time flush.
+    """
+    buffer = SaveBuffer(window=3600, max_pending=100)
+    for module in (api, views):
+        patcher = mock.patch.object(module, "save_buffer", buffer)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return buffer
+
+
+class SaveBufferTests(TestCase):
+    lesson_id = "course/unit/lesson"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("student", password="pw")
+
+    def setUp(self):
+        # A window long enough that only the test flushes.
+        self.buffer = SaveBuffer(window=3600, max_pending=100)
+
+    def get_state(self):
+        return Challenge.objects.values_list("code", "completed").get()
+
+    def test_saves_coalesce(self):
+        for code in ["a", "b", "c"]:
+            self.buffer.add(self.user.pk, self.lesson_id, code)
+        self.buffer.add(self.user.pk, "course/unit/other", "d")
+        self.assertEqual(self.buffer.get(self.user.pk, self.lesson_id), "c")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.buffer.flush()
+
+        writes = [q for q in queries if q["sql"].startswith('INSERT INTO "challenges"')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(
+            dict(Challenge.objects.values_list("lesson_slug", "code")),
+            {"lesson": "c", "other": "d"},
+        )
+        self.assertIs(self.buffer.get(self.user.pk, self.lesson_id), MISSING)
+
+    def test_discard_drops_pending_save(self):
+        self.buffer.add(self.user.pk, self.lesson_id, "a")
+        self.buffer.discard(self.user.pk, self.lesson_id)
+        self.buffer.flush()
+
+        self.assertFalse(Challenge.objects.exists())
+
+    def test_late_flush_does_not_undo_newer_writes(self):
+        # Saved on one worker, then reset and completed on another.
+        self.buffer.add(self.user.pk, self.lesson_id, "old save")
+        api.reset_challenge(self.user.pk, self.lesson_id)
+        self.buffer.flush()
+        self.assertEqual(self.get_state(), (None, False))
+
+        self.buffer.add(self.user.pk, self.lesson_id, "old save")
+        api.complete_challenge(self.user.pk, self.lesson_id, "done")
+        self.buffer.flush()
+        self.assertEqual(self.get_state(), ("done", True))
+        self.assertFalse(ChallengeRevision.objects.filter(code="old save").exists())
+
+        # A save made after the completion still lands.
+        self.buffer.add(self.user.pk, self.lesson_id, "new save")
+        self.buffer.flush()
+        self.assertEqual(self.get_state(), ("new save", True))
+
+    def test_transient_errors_requeue_up_to_max_pending(self):
+        buffer = SaveBuffer(window=3600, max_pending=2)
+        lesson_ids = [f"course/unit/lesson-{i}" for i in range(3)]
+
+        with (
+            mock.patch.object(
+                models.ChallengeQuerySet, "upsert", side_effect=OperationalError
+            ),
+            self.assertLogs("code_challenge.save_buffer", "ERROR") as logs,
+        ):
+            for lesson_id in lesson_ids:
+                buffer.add(self.user.pk, lesson_id, lesson_id)
+
+        self.assertIn("Dropped 1 saved challenges", logs.output[-1])
+        self.assertIs(buffer.get(self.user.pk, lesson_ids[0]), MISSING)
+        buffer.flush()
+        self.assertEqual(
+            sorted(Challenge.objects.values_list("code", flat=True)), lesson_ids[1:]
+        )
+
+
+class SaveBufferCommitTests(TransactionTestCase):
+    """
+    Foreign keys are only checked on commit, which TestCase never reaches.
+    """
+
+    def test_unwritable_save_is_dropped_alone(self):
+        buffer = SaveBuffer(window=3600, max_pending=100)
+        user, deleted = [
+            get_user_model().objects.create_user(name) for name in ["a", "b"]
+        ]
+        buffer.add(user.pk, "course/unit/lesson", "kept")
+        deleted_id = deleted.pk
+        buffer.add(deleted_id, "course/unit/lesson", "dropped")
+        deleted.delete()
+
+        with self.assertLogs("code_challenge.save_buffer", "ERROR") as logs:
+            buffer.flush()
+
+        self.assertEqual(len(logs.output), 1)
+        message = f"Dropped saved course/unit/lesson of user {deleted_id}"
+        self.assertIn(message, logs.output[0])
+        self.assertEqual(Challenge.objects.get().code, "kept")
+        self.assertIs(buffer.get(deleted_id, "course/unit/lesson"), MISSING)
+
+
+class ThreeLessonTestCase(TestCase):
+    """
+    A registered course with one unit of three lessons, "lesson", "second"
+    and "third", and a logged-in student.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        course_dir = write_course(cls.directory.name)
+        write_lessons(course_dir, ["second", "third"])
+        cls.course = build_course(course_dir)
+        courses.replace(cls.course)
+
+    @classmethod
+    def tearDownClass(cls):
+        courses.remove(cls.course)
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("student", password="pw")
+
+    def setUp(self):
+        caches[settings.PROGRESS_CACHE].clear()
+        self.client.force_login(self.user)
+        self.save_buffer = use_private_save_buffer(self)
+
+    def get_progress(self):
+        return UnitProgress.objects.values_list(
+            "completed_count", "completed_lessons"
+        ).get()
+
+
+class BatchTests(ThreeLessonTestCase):
+    def batch(self, operations: list, user_id=MISSING):
+        payload = {
+            "operations": operations,
+            "user_id": self.user.pk if user_id is MISSING else user_id,
+        }
+        return self.client.post(
+            reverse("batch"), json.dumps(payload), content_type="application/json"
+        )
+
+    def get_states(self):
+        return {
+            lesson_slug: (code, completed)
+            for lesson_slug, code, completed in Challenge.objects.values_list(
+                "lesson_slug", "code", "completed"
+            )
+        }
+
+    def test_operations_fold_in_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(
+                [
+                    {"op": "save", "lesson_id": "course/unit/lesson", "code": "a"},
+                    {"op": "complete", "lesson_id": "course/unit/second", "code": "b"},
+                    {"op": "complete", "lesson_id": "course/unit/lesson", "code": "c"},
+                    {"op": "save", "lesson_id": "course/unit/lesson", "code": "d"},
+                    {"op": "reset", "lesson_id": "course/unit/second"},
+                    {"op": "save", "lesson_id": "course/unit/third", "code": "e"},
+                ]
+            )
+
+        self.assertEqual(response.json()["results"], [{"status": "ok"}] * 6)
+        self.assertEqual(
+            self.get_states(),
+            {"lesson": ("d", True), "second": (None, False), "third": ("e", False)},
+        )
+        # lesson and second update code and completed, third only code.
+        writes = [q for q in queries if q["sql"].startswith('INSERT INTO "challenges"')]
+        self.assertEqual(len(writes), 2)
+
+    def test_invalid_operations_fail_alone(self):
+        lesson_id = "course/unit/lesson"
+        response = self.batch(
+            [
+                {"op": "save", "lesson_id": "course/unit/missing", "code": "a"},
+                {"op": "delete", "lesson_id": lesson_id},
+                {"op": "save", "lesson_id": lesson_id, "code": 1},
+                "save",
+                {"op": "save", "lesson_id": lesson_id, "code": "ok"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, ["error", "error", "error", "error", "ok"])
+        self.assertEqual(self.get_states(), {"lesson": ("ok", False)})
+
+    def test_completions_update_progress(self):
+        lesson_url = reverse("lesson_view", args=["course", "unit", "third"])
+        self.assertFalse(self.client.get(lesson_url).context["challenge"]["completed"])
+
+        self.batch(
+            [
+                {"op": "complete", "lesson_id": "course/unit/lesson", "code": "a"},
+                {"op": "complete", "lesson_id": "course/unit/third", "code": "b"},
+            ]
+        )
+        self.assertEqual(self.get_progress(), (2, bytes([0b101])))
+        self.assertTrue(self.client.get(lesson_url).context["challenge"]["completed"])
+
+        self.batch([{"op": "reset", "lesson_id": "course/unit/third"}])
+        self.assertEqual(self.get_progress(), (1, bytes([0b1])))
+        self.assertFalse(self.client.get(lesson_url).context["challenge"]["completed"])
+
+    def test_only_the_queueing_user_is_written(self):
+        operations = [{"op": "save", "lesson_id": "course/unit/lesson", "code": "a"}]
+
+        self.assertEqual(self.batch(operations, user_id=None).status_code, 403)
+        self.assertEqual(self.batch(operations, user_id=-1).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.batch(operations).status_code, 403)
+        self.assertFalse(Challenge.objects.exists())
+
+
+class UnitProgressTests(ThreeLessonTestCase):
+    def complete(self, *slugs: str):
+        for slug in slugs:
+            Challenge.from_lesson_id(
+                self.user.pk, f"course/unit/{slug}", completed=True
+            ).save()
+
+    def test_completions_set_and_clear_bits(self):
+        api.complete_challenge(self.user.pk, "course/unit/third", "a")
+        self.assertEqual(self.get_progress(), (1, bytes([0b100])))
+
+        api.complete_challenge(self.user.pk, "course/unit/lesson", "a")
+        api.complete_challenge(self.user.pk, "course/unit/lesson", "b")
+        self.assertEqual(self.get_progress(), (2, bytes([0b101])))
+
+        api.reset_challenge(self.user.pk, "course/unit/third")
+        api.reset_challenge(self.user.pk, "course/unit/second")
+        self.assertEqual(self.get_progress(), (1, bytes([0b1])))
+
+        api.reset_challenge(self.user.pk, "course/unit/lesson")
+        self.assertEqual(self.get_progress(), (0, b""))
+
+    def test_missing_record_is_rebuilt_from_challenges(self):
+        self.complete("lesson", "third")
+        self.assertFalse(UnitProgress.objects.exists())
+
+        api.complete_challenge(self.user.pk, "course/unit/second", "a")
+
+        self.assertEqual(self.get_progress(), (3, bytes([0b111])))
+
+    def test_layout_change_rebuilds_record(self):
+        self.complete("second")
+        UnitProgress.objects.create(
+            user=self.user,
+            course_slug="course",
+            unit_slug="unit",
+            layout="reordered",
+            completed_count=1,
+            completed_lessons=bytes([0b1]),
+        )
+
+        progress = get_course_progress(self.user.pk, self.course)
+
+        self.assertEqual(progress, {"unit": 0b10})
+        row = UnitProgress.objects.get()
+        self.assertEqual(row.layout, self.course.get_units()[0].layout)
+        self.assertEqual(self.get_progress(), (1, bytes([0b10])))
+
+        row.layout = "reordered"
+        row.save()
+        api.complete_challenge(self.user.pk, "course/unit/third", "a")
+        self.assertEqual(self.get_progress(), (2, bytes([0b110])))
+
+    def test_rebuild_skips_lessons_no_longer_in_the_course(self):
+        self.complete("lesson", "removed")
+
+        progress = get_course_progress(self.user.pk, self.course)
+
+        self.assertEqual(progress, {"unit": 0b1})
+        self.assertEqual(self.get_progress(), (1, bytes([0b1])))
+
+
+class ChallengeViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.course = build_course(write_course(cls.directory.name))
+        courses.replace(cls.course)
+
+    @classmethod
+    def tearDownClass(cls):
+        courses.remove(cls.course)
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("student", password="pw")
+
+    def setUp(self):
+        caches[settings.PROGRESS_CACHE].clear()
+        self.client.force_login(self.user)
+        self.url = reverse("lesson_view", args=["course", "unit", "lesson"])
+        self.save_buffer = use_private_save_buffer(self)
+
+    def test_lesson_view_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        challenge_queries = [q for q in queries if '"challenges"' in q["sql"]]
+        self.assertTrue(challenge_queries)
+        for query in challenge_queries:
+            self.assertTrue(query["sql"].startswith("SELECT"))
+        self.assertFalse(Challenge.objects.exists())
+
+    def test_outline_is_kept_with_its_course(self):
+        outline = get_course_outline(self.course)
+        self.assertIs(get_course_outline(self.course), outline)
+
+        # A reloaded course builds its own; nothing else holds the old one.
+        (reloaded,) = build_courses([self.course.directory])
+        self.assertIsNot(get_course_outline(reloaded), outline)
+        self.assertEqual(
+            [link for _, lessons in outline for _, link in lessons],
+            ["/codilla/course/unit/lesson"],
+        )
+
+    def test_cached_progress_skips_database(self):
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+            self.client.get(reverse("course_view", args=["course"]))
+
+        challenge_queries = [q for q in queries if '"challenges"' in q["sql"]]
+        self.assertEqual(challenge_queries, [])
+
+    def get_saved_code(self, response) -> str:
+        file_system = json.loads(response.context["meta_json"])["file_system"]
+        return file_system["index.html"]["file"]["contents"]
+
+    def test_writes_invalidate_cached_progress(self):
+        self.client.get(self.url)
+        self.client.put(
+            reverse("mark_complete"),
+            json.dumps({"lesson_id": "course/unit/lesson", "code": "<p>Done</p>"}),
+            content_type="application/json",
+        )
+
+        response = self.client.get(self.url)
+
+        self.assertTrue(response.context["challenge"]["completed"])
+        self.assertEqual(self.get_saved_code(response), "<p>Done</p>")
+
+    @override_settings(CHALLENGE_COMPRESS_THRESHOLD=1)
+    def test_progress_does_not_load_saved_code(self):
+        self.put("save_code", {"lesson_id": "course/unit/lesson", "code": "x" * 500})
+        self.save_buffer.flush()
+
+        with CaptureQueriesContext(connection) as queries:
+            progress = load_user_progress(self.user.pk, self.course)
+
+        self.assertEqual(progress["saved"], {"course/unit/lesson"})
+        for query in queries:
+            columns = query["sql"].split(" FROM ")[0]
+            self.assertNotIn('"challenges"."code"', columns)
+
+    def test_progress_loaded_before_a_write_is_not_read(self):
+        cache = caches[settings.PROGRESS_CACHE]
+        key = get_cache_key(self.user.pk, "course")
+        version = get_cache_version(cache, key)
+        stale = load_user_progress(self.user.pk, self.course)
+
+        self.save_buffer.add(self.user.pk, "course/unit/lesson", "<p>Saved</p>")
+        # A cache fill that raced the save lands after it.
+        cache.set(key, stale, version=version)
+
+        response = self.client.get(self.url)
+        self.assertEqual(self.get_saved_code(response), "<p>Saved</p>")
+
+    def test_concurrent_writes_each_retire_the_cached_progress(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            CACHES={
+                **settings.CACHES,
+                "progress": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                },
+            },
+            PROGRESS_CACHE="progress",
+        ):
+            cache = caches["progress"]
+            key = get_cache_key(self.user.pk, "course")
+            version = get_cache_version(cache, key)
+            lesson_ids = ["course/unit/lesson"]
+
+            # A first write retires the version; a page load reads the new one
+            # and loads progress before a second write commits.
+            invalidate_user_progress(self.user.pk, lesson_ids)
+            current = get_cache_version(cache, key)
+            stale = load_user_progress(self.user.pk, self.course)
+            Challenge.from_lesson_id(
+                self.user.pk, "course/unit/lesson", code="<p>Saved</p>"
+            ).save()
+            cache.set(key, stale, version=current)
+            # The second writer read the version before the first one bumped
+            # it, which loses a bump with a get-then-set increment.
+            with mock.patch.object(cache, "get", return_value=version):
+                invalidate_user_progress(self.user.pk, lesson_ids)
+
+            progress = get_user_progress(self.user.pk, self.course)
+            self.assertEqual(progress["saved"], {"course/unit/lesson"})
+
+    def test_complete_endpoint_writes_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.put("mark_complete", {"lesson_id": "course/unit/lesson", "code": "x"})
+
+        challenge_writes = [
+            q
+            for q in queries
+            if '"challenges"' in q["sql"] and not q["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(len(challenge_writes), 1)
+
+    def put(self, op: str, payload: dict):
+        return self.client.put(
+            reverse(op), json.dumps(payload), content_type="application/json"
+        )
+
+    def test_unknown_lesson_is_rejected(self):
+        response = self.put("save_code", {"lesson_id": "course/unit/missing"})
+
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CHALLENGE_MAX_CODE_SIZE=100)
+    def test_oversized_code_is_rejected(self):
+        response = self.put(
+            "mark_complete", {"lesson_id": "course/unit/lesson", "code": "x" * 101}
+        )
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Challenge.objects.exists())
+
+    @override_settings(CHALLENGE_COMPRESS_THRESHOLD=100)
+    def test_large_code_is_stored_compressed(self):
+        code = "<p>Hello</p>\n" * 100
+
+        for compression, marker in [("zlib", CODE_ZLIB), ("zstd", CODE_ZSTD)]:
+            with self.subTest(compression), override_settings(
+                CHALLENGE_CODE_COMPRESSION=compression
+            ):
+                self.put(
+                    "mark_complete", {"lesson_id": "course/unit/lesson", "code": code}
+                )
+                stored = self.get_stored_code()
+
+                self.assertTrue(stored.startswith(marker))
+                self.assertLess(len(stored), len(code))
+                self.assertEqual(Challenge.objects.get().code, code)
+                Challenge.objects.all().delete()
+
+    @override_settings(CHALLENGE_CODE_DELTA=True)
+    def test_edited_starter_code_is_stored_as_delta(self):
+        lesson = courses.get_lesson("course/unit/lesson")
+        code = lesson.starter_code.replace("Hello", "Hi", 1)
+        self.put("mark_complete", {"lesson_id": lesson.id, "code": code})
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT code FROM challenges")
+            (stored,) = cursor.fetchone()
+
+        self.assertTrue(stored.startswith(CODE_DELTA))
+        self.assertLess(len(stored), len(code) / 10)
+        # Another process reads the base back from the archive.
+        models._starter_codes.clear()
+        self.assertEqual(Challenge.objects.get().code, code)
+
+    def get_stored_code(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT code FROM challenges")
+            (stored,) = cursor.fetchone()
+        return stored
+
+    @override_settings(CHALLENGE_CODE_DELTA=True)
+    def test_saves_and_batches_are_stored_as_delta(self):
+        lesson = courses.get_lesson("course/unit/lesson")
+        code = lesson.starter_code.replace("Hello", "Hi", 1)
+
+        self.put("save_code", {"lesson_id": lesson.id, "code": code})
+        self.save_buffer.flush()
+        self.assertTrue(self.get_stored_code().startswith(CODE_DELTA))
+
+        self.put("reset_code", {"lesson_id": lesson.id})
+        self.assertEqual(Challenge.objects.get().code, None)
+
+        operations = [{"op": "save", "lesson_id": lesson.id, "code": code + " "}]
+        self.client.post(
+            reverse("batch"),
+            json.dumps({"operations": operations, "user_id": self.user.pk}),
+            content_type="application/json",
+        )
+        self.assertTrue(self.get_stored_code().startswith(CODE_DELTA))
+        self.assertEqual(Challenge.objects.get().code, code + " ")
+
+    def test_starter_code_is_not_read_without_delta(self):
+        lesson_id = "course/unit/lesson"
+        operations = [{"op": "save", "lesson_id": lesson_id, "code": "b"}]
+
+        with mock.patch.object(
+            Lesson, "starter_code", new_callable=mock.PropertyMock
+        ) as starter_code:
+            self.put("save_code", {"lesson_id": lesson_id, "code": "a"})
+            self.save_buffer.flush()
+            self.put("mark_complete", {"lesson_id": lesson_id, "code": "a"})
+            self.put("reset_code", {"lesson_id": lesson_id})
+            self.client.post(
+                reverse("batch"),
+                json.dumps({"operations": operations, "user_id": self.user.pk}),
+                content_type="application/json",
+            )
+
+        starter_code.assert_not_called()
+        self.assertEqual(Challenge.objects.get().code, "b")
+
+    def test_revisions_skip_identical_snapshots(self):
+        lesson_id = "course/unit/lesson"
+        for code in ["a", "a", "b", "b"]:
+            self.save_buffer.add(self.user.pk, lesson_id, code)
+            self.save_buffer.flush()
+        self.put("mark_complete", {"lesson_id": lesson_id, "code": "b"})
+        self.put("mark_complete", {"lesson_id": lesson_id, "code": "b"})
+
+        revisions = ChallengeRevision.objects.order_by("id")
+        self.assertEqual(
+            list(revisions.values_list("code", "completed")),
+            [("a", False), ("b", False), ("b", True)],
+        )
+
+    def test_prune_keeps_latest_and_completion(self):
+        lesson_id = "course/unit/lesson"
+        self.put("mark_complete", {"lesson_id": lesson_id, "code": "done"})
+        for i in range(5):
+            self.put("mark_complete", {"lesson_id": lesson_id, "code": str(i)})
+        ChallengeRevision.objects.filter(code__in=["0", "1", "2", "3", "4"]).update(
+            completed=False
+        )
+
+        deleted = prune_revisions(keep=2, batch_size=1)
+
+        self.assertEqual(deleted, 3)
+        revisions = ChallengeRevision.objects.order_by("id")
+        self.assertEqual(
+            list(revisions.values_list("code", flat=True)), ["done", "3", "4"]
+        )
+
+    def arequest(self, method: str, path: str, payload: dict | None = None):
+        factory = AsyncRequestFactory()
+        if payload is None:
+            request = getattr(factory, method)(path)
+        else:
+            request = getattr(factory, method)(
+                path, json.dumps(payload), content_type="application/json"
+            )
+
+        async def auser():
+            return self.user
+
+        request.auser = auser
+        return request
+
+    async def test_async_views(self):
+        lesson_id = "course/unit/lesson"
+        save = self.arequest("put", "/", {"lesson_id": lesson_id, "code": "a"})
+        response = await api.asave_code(save)
+        self.assertEqual(response.status_code, 200)
+        await self.save_buffer.aadd(self.user.pk, lesson_id, "b")
+
+        response = await views.alesson(
+            self.arequest("get", self.url), "course", "unit", "lesson"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'{"contents": "b"}', response.content)
+
+        complete = self.arequest("put", "/", {"lesson_id": lesson_id, "code": "c"})
+        await api.amark_complete(complete)
+        challenge = await Challenge.objects.aget(user=self.user)
+        self.assertEqual((challenge.code, challenge.completed), ("c", True))
+
+        await api.areset_code(self.arequest("put", "/", {"lesson_id": lesson_id}))
+        challenge = await Challenge.objects.aget(user=self.user)
+        self.assertEqual((challenge.code, challenge.completed), (None, False))
+
+        bad = self.arequest("put", "/", {"lesson_id": "course/unit/missing"})
+        response = await api.asave_code(bad)
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "app.storage.CompressedManifestStaticFilesStorage"},
+    }
+)
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.makedirs(os.path.join(directory.name, "js"))
+        self.script = b"console.log(1);\n" * 100
+        with open(os.path.join(directory.name, "js", "editor.js"), "wb") as file:
+            file.write(self.script)
+
+        static_root = override_settings(STATIC_ROOT=directory.name)
+        static_root.enable()
+        self.addCleanup(static_root.disable)
+        self.addCleanup(get_hashed_static_names.cache_clear)
+        get_hashed_static_names.cache_clear()
+
+        paths = {"js/editor.js": (staticfiles_storage, "js/editor.js")}
+        list(staticfiles_storage.post_process(paths))
+
+    def test_serves_hashed_files_compressed_and_immutable(self):
+        url = "/static/" + staticfiles_storage.stored_name("js/editor.js")
+        response = self.client.get(url, headers={"accept-encoding": "gzip, br"})
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(
+            brotli.decompress(b"".join(response.streaming_content)), self.script
+        )
+
+        response = self.client.get(url, headers={"accept-encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/javascript")
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)), self.script
+        )
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn("require-corp", response["Cross-Origin-Embedder-Policy"])
+
+        response = self.client.get(url)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(b"".join(response.streaming_content), self.script)
+
+        response = self.client.get("/static/js/editor.js")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertIn("same-origin", response["Cross-Origin-Opener-Policy"])
@@ -1,13 +1,29 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 from . import api
 
+if settings.ASYNC_VIEWS:
+    mark_complete = api.amark_complete
+    save_code = api.asave_code
+    reset_code = api.areset_code
+    lesson = views.alesson
+else:
+    mark_complete = api.mark_complete
+    save_code = api.save_code
+    reset_code = api.reset_code
+    lesson = views.lesson
+
 urlpatterns = [
     path("", views.courses_index, name="courses"),
-    path("api/challenge/complete", api.mark_complete, name="mark_complete"),
-    path("api/challenge/save", api.save_code, name="save_code"),
-    path("api/challenge/reset", api.reset_code, name="reset_code"),
+    path("api/challenge/complete", mark_complete, name="mark_complete"),
+    path("api/challenge/save", save_code, name="save_code"),
+    path("api/challenge/reset", reset_code, name="reset_code"),
+    path("api/challenge/batch", api.batch, name="batch"),
+    path(
+        "api/lesson-files/stats", api.lesson_file_stats, name="lesson_file_stats"
+    ),
     path("<slug:course_slug>", views.course_view, name="course_view"),
     path(
         "<slug:course_slug>/<slug:unit_slug>",
@@ -16,7 +32,7 @@ urlpatterns = [
     ),
     path(
         "<slug:course_slug>/<slug:unit_slug>/<slug:lesson_slug>",
-        views.lesson,
+        lesson,
         name="lesson_view",
     ),
 ]
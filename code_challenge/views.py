@@ -1,14 +1,19 @@
-from collections import defaultdict
-import json
-import markdown
-from markdown.extensions.codehilite import CodeHiliteExtension
 from django.http import Http404, HttpResponseServerError, JsonResponse
 from django.shortcuts import redirect, render
-from django.urls import reverse
+from .lesson_context import get_request_context
 from .models import Challenge, Enrollments
+from .navigation import get_course_outline
+from .progress import aget_user_progress, get_user_progress
+from .save_buffer import MISSING, save_buffer
 from .importer.build_courses import courses
 from .importer.parsers import Lesson
 
+LESSON_TEMPLATES = {
+    "editor": "code_challenge/editor.html",
+    "repl": "code_challenge/terminal.html",
+    "playground": "code_challenge/playground_editor.html",
+}
+
 
 def get_course(course_slug):
     course = courses.get(course_slug)
@@ -19,30 +24,6 @@ def get_course(course_slug):
     return course
 
 
-def render_markdown(code: str) -> str:
-    return markdown.markdown(
-        code,
-        extensions=[
-            "fenced_code",
-            CodeHiliteExtension(noclasses=True, pygments_style="dracula"),
-            "attr_list",
-            "extra",
-        ],
-    )
-
-
-def get_starter_code(lesson: Lesson):
-    if lesson.language == "html":
-        return json.dumps(
-            {
-                "html": lesson.source_file,
-                "css": lesson.style_file,
-                "js": lesson.script_file,
-            }
-        )
-    return lesson.source_file
-
-
 def courses_index(request):
     if request.user.is_authenticated:
         enrolled_courses = Enrollments.objects.filter(user=request.user).values_list(
@@ -69,31 +50,18 @@ def course_view(request, course_slug=""):
     course = get_course(course_slug)
 
     if request.user.is_authenticated:
-        completed_lessons = Challenge.objects.filter(
-            user=request.user, course_slug=course_slug, completed=True
-        )
-
-        completed_by_unit = defaultdict(list)
-        for challenge in completed_lessons:
-            completed_by_unit[challenge.unit_slug].append(challenge.lesson_id)
-
-        lessons_by_unit = [
-            [
-                unit,
-                [lesson for lesson in unit.get_lessons()],
-                completed_by_unit.get(unit.slug),
-            ]
-            for unit in course.get_units()
-        ]
+        completed = get_user_progress(request.user.pk, course)["completed"]
     else:
-        lessons_by_unit = [
-            [
-                unit,
-                [lesson for lesson in unit.get_lessons()],
-                [],  # If not authenticated, no lessons completed
-            ]
-            for unit in course.get_units()
+        completed = set()  # If not authenticated, no lessons completed
+
+    lessons_by_unit = []
+    for unit, lessons in get_course_outline(course):
+        unit_lessons = [
+            (lesson, link, lesson.id in completed) for lesson, link in lessons
         ]
+        lessons_by_unit.append(
+            [unit, unit_lessons, sum(done for _, _, done in unit_lessons)]
+        )
 
     return render(
         request,
@@ -110,171 +78,114 @@ def units_redirect(request, course_slug, unit_slug):
 
 
 def lesson(request, course_slug="", unit_slug="", lesson_slug=""):
-    course = get_course(course_slug)
-    lesson = course.get_lesson(unit_slug, lesson_slug)
+    lesson = courses.get_lesson(f"{course_slug}/{unit_slug}/{lesson_slug}")
 
     if not lesson:
         raise Http404()
 
     if request.user.is_authenticated:
-        challenge, _ = Challenge.objects.get_or_create(
-            user=request.user,
+        code, completed = get_challenge_state(request.user.pk, lesson)
+    else:
+        code, completed = None, False
+
+    template = get_lesson_template(lesson)
+
+    if not template:
+        return HttpResponseServerError(
+            b"Oops. Something went wrong. Reloading the page is unlikely to help."
+        )
+
+    context = get_request_context(lesson, completed, code, request.user)
+
+    return render(request, template, context=context)
+
+
+async def alesson(request, course_slug="", unit_slug="", lesson_slug=""):
+    lesson = courses.get_lesson(f"{course_slug}/{unit_slug}/{lesson_slug}")
+
+    if not lesson:
+        raise Http404()
+
+    # Resolve the user up front so templates reading request.user do not hit
+    # the session or database from the event loop.
+    request.user = user = await request.auser()
+
+    if user.is_authenticated:
+        code, completed = await aget_challenge_state(user.pk, lesson)
+    else:
+        code, completed = None, False
+
+    template = get_lesson_template(lesson)
+
+    if not template:
+        return HttpResponseServerError(
+            b"Oops. Something went wrong. Reloading the page is unlikely to help."
+        )
+
+    context = get_request_context(lesson, completed, code, user)
+
+    return render(request, template, context=context)
+
+
+def get_challenge_state(user_id: int, lesson: Lesson):
+    """
+    The saved code and completed flag for a lesson, read without creating a
+    row; rows are only written once the student saves or completes. The
+    database is only queried when the cached progress shows saved code.
+    """
+    progress = get_user_progress(user_id, lesson.parent.parent)
+    completed = lesson.id in progress["completed"]
+
+    code = save_buffer.get(user_id, lesson.id)
+    if code is not MISSING:
+        return code, completed
+
+    if lesson.id not in progress["saved"]:
+        return None, completed
+
+    course_slug, unit_slug, lesson_slug = lesson.id.split("/")
+    code = (
+        Challenge.objects.filter(
+            user_id=user_id,
             course_slug=course_slug,
             unit_slug=unit_slug,
             lesson_slug=lesson_slug,
         )
-    else:
-        challenge = Challenge(completed=False)
-
-    if lesson.type == "editor":
-        if lesson.language == "html":
-            return render_html_editor(request, lesson, challenge)
-        return render_editor(request, lesson, challenge)
-    if lesson.type == "repl":
-        return render_terminal(request, lesson, challenge)
-    if lesson.type == "playground":
-        return render_playground(request, lesson, challenge)
-
-    return HttpResponseServerError(
-        b"Oops. Something went wrong. Reloading the page is unlikely to help."
+        .values_list("code", flat=True)
+        .first()
     )
 
+    return code, completed
 
-def render_editor(request, lesson, challenge):
-    course_title = lesson.parent.parent.title
-
-    context = {
-        "challenge": {
-            "title": lesson.title,
-            "lesson_id": lesson.id,
-            "completed": challenge.completed,
-            "language": lesson.language,
-            "has_tests": lesson.tests,
-            "exports": lesson.exports,
-            "file_system": lesson.create_file_system(challenge.code or None),
-            "starter_code": get_starter_code(lesson),
-            "instructions": render_markdown(lesson.instructions_file),
-            "parent": {
-                "link": reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": course_title,
-            },
-            "next_lesson": {
-                "link": reverse("lesson_view", args=lesson.next.id.split("/"))
-                if lesson.next
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.next.title if lesson.next else course_title,
-            },
-            "previous_lesson": {
-                "link": reverse("lesson_view", args=lesson.previous.id.split("/"))
-                if lesson.previous
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.previous.title if lesson.previous else course_title,
-            },
-            "user": {"authenticated": request.user.is_authenticated},
-        },
-    }
-
-    return render(request, "code_challenge/editor.html", context=context)
-
-
-def render_html_editor(request, lesson, challenge):
-    course_title = lesson.parent.parent.title
-
-    context = {
-        "challenge": {
-            "title": lesson.title,
-            "lesson_id": lesson.id,
-            "completed": challenge.completed,
-            "has_tests": lesson.tests,
-            "exports": lesson.exports,
-            "file_system": lesson.create_file_system(challenge.code or None),
-            "starter_code": get_starter_code(lesson),
-            "instructions": render_markdown(lesson.instructions_file),
-            "parent": {
-                "link": reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": course_title,
-            },
-            "next_lesson": {
-                "link": reverse("lesson_view", args=lesson.next.id.split("/"))
-                if lesson.next
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.next.title if lesson.next else course_title,
-            },
-            "previous_lesson": {
-                "link": reverse("lesson_view", args=lesson.previous.id.split("/"))
-                if lesson.previous
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.previous.title if lesson.previous else course_title,
-            },
-            "user": {"authenticated": request.user.is_authenticated},
-        },
-    }
-
-    return render(request, "code_challenge/html_editor.html", context=context)
-
-def render_playground(request, lesson, challenge):
-    course_title = lesson.parent.parent.title
-
-    context = {
-        "challenge": {
-            "title": lesson.title,
-            "lesson_id": lesson.id,
-            "completed": challenge.completed,
-            "has_tests": lesson.tests,
-            "exports": lesson.exports,
-            "file_system": lesson.create_file_system(challenge.code or None),
-            "starter_code": get_starter_code(lesson),
-            "instructions": render_markdown(lesson.instructions_file),
-            "parent": {
-                "link": reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": course_title,
-            },
-            "next_lesson": {
-                "link": reverse("lesson_view", args=lesson.next.id.split("/"))
-                if lesson.next
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.next.title if lesson.next else course_title,
-            },
-            "previous_lesson": {
-                "link": reverse("lesson_view", args=lesson.previous.id.split("/"))
-                if lesson.previous
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.previous.title if lesson.previous else course_title,
-            },
-            "user": {"authenticated": request.user.is_authenticated},
-        },
-    }
-
-    return render(request, "code_challenge/playground_editor.html", context=context)
-
-def render_terminal(request, lesson, challenge):
-    course_title = lesson.parent.parent.title
-
-    context = {
-        "challenge": {
-            "title": lesson.title,
-            "lesson_id": lesson.id,
-            "completed": challenge.completed,
-            "instructions": render_markdown(lesson.instructions_file),
-            "has_tests": lesson.tests,
-            "parent": {
-                "link": reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": course_title,
-            },
-            "next_lesson": {
-                "link": reverse("lesson_view", args=lesson.next.id.split("/"))
-                if lesson.next
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.next.title if lesson.next else course_title,
-            },
-            "previous_lesson": {
-                "link": reverse("lesson_view", args=lesson.previous.id.split("/"))
-                if lesson.previous
-                else reverse("course_view", args=[lesson.parent.parent.slug]),
-                "title": lesson.previous.title if lesson.previous else course_title,
-            },
-            "user": {"authenticated": request.user.is_authenticated},
-        },
-    }
 
-    return render(request, "code_challenge/terminal.html", context=context)
+async def aget_challenge_state(user_id: int, lesson: Lesson):
+    progress = await aget_user_progress(user_id, lesson.parent.parent)
+    completed = lesson.id in progress["completed"]
+
+    code = save_buffer.get(user_id, lesson.id)
+    if code is not MISSING:
+        return code, completed
+
+    if lesson.id not in progress["saved"]:
+        return None, completed
+
+    course_slug, unit_slug, lesson_slug = lesson.id.split("/")
+    code = await (
+        Challenge.objects.filter(
+            user_id=user_id,
+            course_slug=course_slug,
+            unit_slug=unit_slug,
+            lesson_slug=lesson_slug,
+        )
+        .values_list("code", flat=True)
+        .afirst()
+    )
+
+    return code, completed
+
+
+def get_lesson_template(lesson: Lesson):
+    if lesson.type == "editor" and lesson.language == "html":
+        return "code_challenge/html_editor.html"
+
+    return LESSON_TEMPLATES.get(lesson.type)
@@ -1,5 +1,74 @@
+import gc
+import os
+
 bind = "localhost:3000"
 workers = 4
 keepalive = 5
 
 wsgi_app = "app.wsgi:application"
+
+# GUNICORN_ASGI=1 runs uvicorn workers on app.asgi instead, which serves the
+# challenge API and lesson view with their async variants (ASYNC_VIEWS). The
+# same can be run without gunicorn: uvicorn app.asgi:application --workers 4
+if os.environ.get("GUNICORN_ASGI", "0") != "0":
+    worker_class = "uvicorn_worker.UvicornWorker"
+    wsgi_app = "app.asgi:application"
+
+# Load the app, and with it every course, once in the master. Forked workers
+# then share the course content copy-on-write instead of each parsing and
+# holding their own copy.
+#
+# The catch: kill -HUP only re-forks workers from the already loaded master,
+# so it no longer picks up new code or courses. Deploy with a full restart,
+# reload courses in place with COURSE_AUTO_RELOAD=1, or set GUNICORN_PRELOAD=0
+# to get the usual HUP reload back at the cost of the shared memory.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+def read_memory_usage():
+    """
+    Rss, Pss and private memory of the current process in kB, from
+    /proc/self/smaps_rollup (Linux only).
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    usage[key] = int(value.split()[0])
+    except OSError:
+        return None
+
+    usage["Private"] = usage.pop("Private_Clean", 0) + usage.pop("Private_Dirty", 0)
+    return usage
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    from code_challenge.preload import warm_up
+
+    warm_up()
+    # Move everything loaded so far into the permanent generation so the
+    # cyclic GC in workers never writes to (and un-shares) those pages.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    usage = read_memory_usage()
+    if usage:
+        worker.log.info(
+            "Worker %s memory: rss=%dkB pss=%dkB private=%dkB",
+            worker.pid,
+            usage["Rss"],
+            usage["Pss"],
+            usage["Private"],
+        )
+
+
+def worker_exit(server, worker):
+    from code_challenge.save_buffer import save_buffer
+
+    save_buffer.flush()